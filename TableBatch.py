@@ -0,0 +1,240 @@
+"""
+TableBatch: command line tool to decode/encode .tbl files without GUI
+
+    python TableBatch.py decode <definitions dir> <.tbl files or dirs> -o <output dir> [-f json|csv]
+    python TableBatch.py encode <definitions dir> <.json/.csv files or dirs> -o <output dir>
+    python TableBatch.py diff <definitions dir> <.tbl file or dir> <.tbl file or dir>
+    python TableBatch.py apply <definitions dir> <baseline .tbl file> <partial .tbl files> -o <output dir>
+
+decode writes one values file (name,value) per .tbl file,
+encode writes one .tbl file per values file,
+diff prints the items differing between the .tbl files of the same name,
+apply writes the baseline updated by the partial tables, in their order.
+This module never imports Qt.
+"""
+import io
+import os
+import sys
+import csv
+import json
+import argparse
+import concurrent.futures
+from TableObject import *
+from TableDefinitionLoader import TableDefinitionLoader
+from TableDiff import diffFiles
+
+# tables definition of the worker process
+_tablesdefinition=None
+
+def initWorker(dirname):
+    global _tablesdefinition
+    _tablesdefinition,errors=TableDefinitionLoader(dirname,workers=1).load()
+
+
+def listFiles(paths,extensions):
+    # files with one of the extensions, directories being expanded (not recursively)
+    files=[]
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path,file) for file in os.listdir(path)
+                                if os.path.splitext(file)[1].lower() in extensions))
+        else:
+            files.append(path)
+    return files
+
+
+def outputName(filename,outdir,extension):
+    return os.path.join(outdir,os.path.splitext(os.path.basename(filename))[0]+extension)
+
+
+def writeValues(table,filename):
+    # values file: json object or csv rows (name,value) in the table order.
+    # The values are serialized before writing a temporary file replacing
+    # filename: filename is unchanged on error
+    values=[(item.name,value) for item,value in zip(table.tabledef.items,table.values)]
+    if filename.endswith(".csv"):
+        buffer=io.StringIO(newline='')
+        writer=csv.writer(buffer)
+        writer.writerow(["name","value"])
+        writer.writerows(values)
+        content=buffer.getvalue()
+    else:
+        content=json.dumps(dict(values),indent=1)
+    tmpname="{0}.{1}.tmp".format(filename,os.getpid())
+    try:
+        with open(tmpname,'w',newline='') as fd:
+            fd.write(content)
+        os.replace(tmpname,filename)
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+def readValues(filename):
+    # list of (name,value) from a json or csv values file
+    if filename.lower().endswith(".csv"):
+        with open(filename,'r',newline='') as fd:
+            rows=[row for row in csv.reader(fd) if row]
+        if rows and [v.lower() for v in rows[0]]==["name","value"]:
+            rows=rows[1:]
+        return [(row[0],row[1]) for row in rows]
+    with open(filename,'r') as fd:
+        return list(json.load(fd).items())
+
+
+def castValue(item,value):
+    # values file value to table value (enumerated values may be given by their number)
+    try:
+        return item.cast(value)
+    except KeyError:
+        return int(value,0)
+
+
+def decodeFile(filename,outdir,fmt="json",bigendian=True):
+    # .tbl file to values file: (output file,error message)
+    table=TableObject()
+    try:
+        tblname=table.decodeTableName(filename,bigendian)
+        if tblname not in _tablesdefinition:
+            return None,"No table definition available for table name '{0}'".format(tblname)
+        table.loadTableDefinition(_tablesdefinition[tblname])
+        table.decode(filename,bigendian)
+        output=outputName(filename,outdir,"."+fmt)
+        writeValues(table,output)
+        return output,None
+    except (struct.error,TypeError,ValueError,OSError) as err:
+        return None,"{0}: {1}".format(type(err).__name__,err)
+
+
+def encodeFile(filename,outdir,bigendian=True,settime=True):
+    # values file to .tbl file: (output file,error message)
+    try:
+        values=readValues(filename)
+        tblname=dict((name.lower(),value) for name,value in values).get("tablename")
+        if tblname not in _tablesdefinition:
+            return None,"No table definition available for table name '{0}'".format(tblname)
+        table=TableObject(_tablesdefinition[tblname])
+        names=[name for name,value in values]
+        for name,row,(_,value) in zip(names,table.tabledef.findIndices(names),values):
+            if row is None:
+                return None,"{0} not found in table {1}".format(name,tblname)
+            casted=castValue(table.tabledef.items[row],value)
+            if casted is None:
+                return None,"{0} value error {1}".format(name,value)
+            table.setValue(row,casted)
+        # partial table if Offset/NumBytes don't cover the whole table
+        offset=table.values[table.tabledef.findIndex("Offset")]
+        nbytes=table.values[table.tabledef.findIndex("NumBytes")]
+        if offset==0 and nbytes==table.tabledef.bytesSize()-HEADER_SIZE:
+            offset,nbytes=0,None
+        output=outputName(filename,outdir,".tbl")
+        table.encode(output,offset,nbytes,bigendian,settime)
+        return output,None
+    except (struct.error,TypeError,ValueError,KeyError,OSError) as err:
+        return None,"{0}: {1}".format(type(err).__name__,err)
+
+
+def diffFile(filename,other,bigendian=True):
+    # .tbl files differences: (list of (name,value,other value),error message)
+    try:
+        if os.path.isdir(other):
+            other=os.path.join(other,os.path.basename(filename))
+        tabledef,differences=diffFiles(filename,other,_tablesdefinition,bigendian)
+        return [(tabledef.items[row].name,value,othervalue) for row,value,othervalue in differences],None
+    except (struct.error,TypeError,ValueError,OSError) as err:
+        return None,"{0}: {1}".format(type(err).__name__,err)
+
+
+def applyFile(filename,loads,outdir,bigendian=True):
+    # baseline .tbl file updated by the partial .tbl files: (output file with its CRC,error message)
+    table=TableObject()
+    try:
+        tblname=table.decodeTableName(filename,bigendian)
+        if tblname not in _tablesdefinition:
+            return None,"No table definition available for table name '{0}'".format(tblname)
+        table.loadTableDefinition(_tablesdefinition[tblname])
+        table.decode(filename,bigendian)
+        crc=table.applyLoads(loads,bigendian)
+        output=outputName(filename,outdir,".tbl")
+        table.encode(output,0,None,bigendian,settime=False)
+        return "{0} (CRC 0x{1:04x})".format(output,crc),None
+    except (struct.error,TypeError,ValueError,OSError) as err:
+        return None,"{0}: {1}".format(type(err).__name__,err)
+
+
+def run(function,files,dirname,workers,*args):
+    # apply function to each file in a pool of processes: iterator of (file,output,error)
+    if workers>1 and len(files)>1:
+        with concurrent.futures.ProcessPoolExecutor(workers,initializer=initWorker,initargs=(dirname,)) as executor:
+            futures=[executor.submit(function,file,*args) for file in files]
+            for file,future in zip(files,futures):
+                yield (file,)+future.result()
+    else:
+        initWorker(dirname)
+        for file in files:
+            yield (file,)+function(file,*args)
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="decode/encode/diff/apply cFE table files (.tbl) without GUI")
+    parser.add_argument("command",choices=["decode","encode","diff","apply"])
+    parser.add_argument("definitions",help="tables definition directory (.json)")
+    parser.add_argument("inputs",nargs="+",help="files or directories to process (diff: the 2 files or directories to compare, apply: the baseline then the partial tables)")
+    parser.add_argument("-o","--output",default=".",help="output directory")
+    parser.add_argument("-f","--format",choices=["json","csv"],default="json",help="values file format (decode)")
+    parser.add_argument("-j","--workers",type=int,default=os.cpu_count() or 1,help="number of processes")
+    parser.add_argument("--little-endian",action="store_true",help="little endian convention")
+    parser.add_argument("--keep-time",action="store_true",help="keep TimeSeconds/TimeSubSeconds of the values file (encode)")
+    args=parser.parse_args(argv)
+
+    bigendian=not args.little_endian
+    if args.command=="diff":
+        if len(args.inputs)!=2:
+            parser.error("diff compares 2 files or directories")
+        files=listFiles(args.inputs[:1],[".tbl"])
+        return printDifferences(run(diffFile,files,args.definitions,args.workers,args.inputs[1],bigendian),len(files))
+    os.makedirs(args.output,exist_ok=True)
+    if args.command=="apply":
+        if len(args.inputs)<2:
+            parser.error("apply requires a baseline and partial tables")
+        initWorker(args.definitions)
+        output,error=applyFile(args.inputs[0],listFiles(args.inputs[1:],[".tbl"]),args.output,bigendian)
+        if error:
+            print("ERROR {0}: {1}".format(args.inputs[0],error),file=sys.stderr)
+            return 1
+        print("{0} -> {1}".format(args.inputs[0],output))
+        return 0
+    if args.command=="decode":
+        files=listFiles(args.inputs,[".tbl"])
+        results=run(decodeFile,files,args.definitions,args.workers,args.output,args.format,bigendian)
+    else:
+        files=listFiles(args.inputs,[".json",".csv"])
+        results=run(encodeFile,files,args.definitions,args.workers,args.output,bigendian,not args.keep_time)
+    errors=0
+    for file,output,error in results:
+        if error:
+            errors+=1
+            print("ERROR {0}: {1}".format(file,error),file=sys.stderr)
+        else:
+            print("{0} -> {1}".format(file,output))
+    print("{0} files processed, {1} errors".format(len(files),errors))
+    return 1 if errors else 0
+
+
+def printDifferences(results,count):
+    errors=0
+    for file,differences,error in results:
+        if error:
+            errors+=1
+            print("ERROR {0}: {1}".format(file,error),file=sys.stderr)
+        else:
+            print("{0}: {1} differences".format(file,len(differences)))
+            for name,value,othervalue in differences:
+                print("  {0}\t{1}\t{2}".format(name,value,othervalue))
+    print("{0} files compared, {1} errors".format(count,errors))
+    return 1 if errors else 0
+
+
+if __name__=="__main__":
+    sys.exit(main())
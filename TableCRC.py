@@ -1,42 +1,197 @@
 import struct
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional: pure python slicing-by-8 is used instead
+    np=None
+
+CRC16ARC_TABLE = (0x0000, 0xC0C1, 0xC181, 0x0140, 0xC301, 0x03C0, 0x0280,
+                  0xC241, 0xC601, 0x06C0, 0x0780, 0xC741, 0x0500, 0xC5C1, 0xC481,
+                  0x0440, 0xCC01, 0x0CC0, 0x0D80, 0xCD41, 0x0F00, 0xCFC1, 0xCE81,
+                  0x0E40, 0x0A00, 0xCAC1, 0xCB81, 0x0B40, 0xC901, 0x09C0, 0x0880,
+                  0xC841, 0xD801, 0x18C0, 0x1980, 0xD941, 0x1B00, 0xDBC1, 0xDA81,
+                  0x1A40, 0x1E00, 0xDEC1, 0xDF81, 0x1F40, 0xDD01, 0x1DC0, 0x1C80,
+                  0xDC41, 0x1400, 0xD4C1, 0xD581, 0x1540, 0xD701, 0x17C0, 0x1680,
+                  0xD641, 0xD201, 0x12C0, 0x1380, 0xD341, 0x1100, 0xD1C1, 0xD081,
+                  0x1040, 0xF001, 0x30C0, 0x3180, 0xF141, 0x3300, 0xF3C1, 0xF281,
+                  0x3240, 0x3600, 0xF6C1, 0xF781, 0x3740, 0xF501, 0x35C0, 0x3480,
+                  0xF441, 0x3C00, 0xFCC1, 0xFD81, 0x3D40, 0xFF01, 0x3FC0, 0x3E80,
+                  0xFE41, 0xFA01, 0x3AC0, 0x3B80, 0xFB41, 0x3900, 0xF9C1, 0xF881,
+                  0x3840, 0x2800, 0xE8C1, 0xE981, 0x2940, 0xEB01, 0x2BC0, 0x2A80,
+                  0xEA41, 0xEE01, 0x2EC0, 0x2F80, 0xEF41, 0x2D00, 0xEDC1, 0xEC81,
+                  0x2C40, 0xE401, 0x24C0, 0x2580, 0xE541, 0x2700, 0xE7C1, 0xE681,
+                  0x2640, 0x2200, 0xE2C1, 0xE381, 0x2340, 0xE101, 0x21C0, 0x2080,
+                  0xE041, 0xA001, 0x60C0, 0x6180, 0xA141, 0x6300, 0xA3C1, 0xA281,
+                  0x6240, 0x6600, 0xA6C1, 0xA781, 0x6740, 0xA501, 0x65C0, 0x6480,
+                  0xA441, 0x6C00, 0xACC1, 0xAD81, 0x6D40, 0xAF01, 0x6FC0, 0x6E80,
+                  0xAE41, 0xAA01, 0x6AC0, 0x6B80, 0xAB41, 0x6900, 0xA9C1, 0xA881,
+                  0x6840, 0x7800, 0xB8C1, 0xB981, 0x7940, 0xBB01, 0x7BC0, 0x7A80,
+                  0xBA41, 0xBE01, 0x7EC0, 0x7F80, 0xBF41, 0x7D00, 0xBDC1, 0xBC81,
+                  0x7C40, 0xB401, 0x74C0, 0x7580, 0xB541, 0x7700, 0xB7C1, 0xB681,
+                  0x7640, 0x7200, 0xB2C1, 0xB381, 0x7340, 0xB101, 0x71C0, 0x7080,
+                  0xB041, 0x5000, 0x90C1, 0x9181, 0x5140, 0x9301, 0x53C0, 0x5280,
+                  0x9241, 0x9601, 0x56C0, 0x5780, 0x9741, 0x5500, 0x95C1, 0x9481,
+                  0x5440, 0x9C01, 0x5CC0, 0x5D80, 0x9D41, 0x5F00, 0x9FC1, 0x9E81,
+                  0x5E40, 0x5A00, 0x9AC1, 0x9B81, 0x5B40, 0x9901, 0x59C0, 0x5880,
+                  0x9841, 0x8801, 0x48C0, 0x4980, 0x8941, 0x4B00, 0x8BC1, 0x8A81,
+                  0x4A40, 0x4E00, 0x8EC1, 0x8F81, 0x4F40, 0x8D01, 0x4DC0, 0x4C80,
+                  0x8C41, 0x4400, 0x84C1, 0x8581, 0x4540, 0x8701, 0x47C0, 0x4680,
+                  0x8641, 0x8201, 0x42C0, 0x4380, 0x8341, 0x4100, 0x81C1, 0x8081,
+                  0x4040)
+
+def _zeroTable(table):
+    # table of CRC of byte i followed by one zero byte
+    return tuple((crc >> 8) ^ CRC16ARC_TABLE[crc & 0xFF] for crc in table)
+
+# slicing-by-8 tables: CRC16ARC_SLICES[k][i] is CRC of byte i followed by k zero bytes
+CRC16ARC_SLICES=[CRC16ARC_TABLE]
+for _k in range(7):
+    CRC16ARC_SLICES.append(_zeroTable(CRC16ARC_SLICES[-1]))
+
+# minimal buffer size to use numpy lanes
+NUMPY_THRESHOLD=1 << 14
+NUMPY_LANES=4096
+
+
+def _bytesView(buffer):
+    view=memoryview(buffer)
+    if view.format != 'B' or view.ndim != 1:
+        view=view.cast('B')
+    return view
+
+
+def _updateBytes(crc,view):
+    # byte per byte update, for small buffers and tails
+    table=CRC16ARC_TABLE
+    for b in view:
+        crc=(crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    return crc
+
+
+def _updateSlicing8(crc,view):
+    # slicing-by-8 update: 8 bytes per iteration
+    t0,t1,t2,t3,t4,t5,t6,t7=CRC16ARC_SLICES
+    n=len(view) & ~7
+    for b0,b1,b2,b3,b4,b5,b6,b7 in struct.iter_unpack("8B",view[:n]):
+        x=crc ^ b0 ^ (b1 << 8)
+        crc=(t7[x & 0xFF] ^ t6[x >> 8] ^ t5[b2] ^ t4[b3] ^
+             t3[b4] ^ t2[b5] ^ t1[b6] ^ t0[b7])
+    return _updateBytes(crc,view[n:])
+
+
+class _ShiftOperator(object):
+    """
+    linear operator over GF(2) equivalent to feed the CRC with n zero bytes,
+    stored as 2 tables indexed by the low and high bytes of the CRC
+    """
+    def __init__(self,columns):
+        self.low=tuple(self._apply(columns,i) for i in range(256))
+        self.high=tuple(self._apply(columns,i << 8) for i in range(256))
+
+    @staticmethod
+    def _apply(columns,crc):
+        result=0
+        i=0
+        while crc:
+            if crc & 1:
+                result^=columns[i]
+            crc>>=1
+            i+=1
+        return result
+
+    def __call__(self,crc):
+        return self.low[crc & 0xFF] ^ self.high[crc >> 8]
+
+    def columns(self):
+        return [self(1 << i) for i in range(16)]
+
+    def square(self):
+        columns=self.columns()
+        return _ShiftOperator([self(c) for c in columns])
+
+
+# _SHIFT_OPERATORS[k] feeds 2**k zero bytes
+_SHIFT_OPERATORS=[_ShiftOperator([(1 << i >> 8) ^ CRC16ARC_TABLE[(1 << i) & 0xFF] for i in range(16)])]
+
+
+def crc16arcShift(crc,nbytes):
+    # CRC after nbytes zero bytes, in O(log(nbytes))
+    k=0
+    while nbytes:
+        if k == len(_SHIFT_OPERATORS):
+            _SHIFT_OPERATORS.append(_SHIFT_OPERATORS[-1].square())
+        if nbytes & 1:
+            crc=_SHIFT_OPERATORS[k](crc)
+        nbytes>>=1
+        k+=1
+    return crc
+
+
+def crc16arcCombine(crc1,crc2,len2):
+    # CRC of the concatenation of buffer1 (crc1) and buffer2 (crc2, len2 bytes)
+    return crc16arcShift(crc1,len2) ^ crc2
+
+
+def _updateNumpy(crc,view):
+    # the buffer is split in lanes processed together, then combined
+    lanes=min(NUMPY_LANES,len(view) >> 8)
+    length=len(view) // lanes
+    body=np.frombuffer(view,dtype=np.uint8,count=lanes * length)
+    columns=body.reshape(lanes,length).T.astype(np.uint32)
+    table=np.array(CRC16ARC_TABLE,dtype=np.uint32)
+    crcs=np.zeros(lanes,dtype=np.uint32)
+    for column in columns:
+        crcs=(crcs >> 8) ^ table[(crcs ^ column) & 0xFF]
+    shift=_ShiftOperator([crc16arcShift(1 << i,length) for i in range(16)])
+    for lane in crcs.tolist():
+        crc=shift(crc) ^ lane
+    return _updateSlicing8(crc,view[lanes * length:])
+
+
+def crc16arcUpdate(crc,buffer):
+    # continue the CRC computation with buffer
+    view=_bytesView(buffer)
+    if np is not None and len(view) >= NUMPY_THRESHOLD:
+        return _updateNumpy(crc,view)
+    return _updateSlicing8(crc,view)
+
 
 def crc16arc(buffer):
-    crc16tab = (0x0000, 0xC0C1, 0xC181, 0x0140, 0xC301, 0x03C0, 0x0280,
-                0xC241, 0xC601, 0x06C0, 0x0780, 0xC741, 0x0500, 0xC5C1, 0xC481,
-                0x0440, 0xCC01, 0x0CC0, 0x0D80, 0xCD41, 0x0F00, 0xCFC1, 0xCE81,
-                0x0E40, 0x0A00, 0xCAC1, 0xCB81, 0x0B40, 0xC901, 0x09C0, 0x0880,
-                0xC841, 0xD801, 0x18C0, 0x1980, 0xD941, 0x1B00, 0xDBC1, 0xDA81,
-                0x1A40, 0x1E00, 0xDEC1, 0xDF81, 0x1F40, 0xDD01, 0x1DC0, 0x1C80,
-                0xDC41, 0x1400, 0xD4C1, 0xD581, 0x1540, 0xD701, 0x17C0, 0x1680,
-                0xD641, 0xD201, 0x12C0, 0x1380, 0xD341, 0x1100, 0xD1C1, 0xD081,
-                0x1040, 0xF001, 0x30C0, 0x3180, 0xF141, 0x3300, 0xF3C1, 0xF281,
-                0x3240, 0x3600, 0xF6C1, 0xF781, 0x3740, 0xF501, 0x35C0, 0x3480,
-                0xF441, 0x3C00, 0xFCC1, 0xFD81, 0x3D40, 0xFF01, 0x3FC0, 0x3E80,
-                0xFE41, 0xFA01, 0x3AC0, 0x3B80, 0xFB41, 0x3900, 0xF9C1, 0xF881,
-                0x3840, 0x2800, 0xE8C1, 0xE981, 0x2940, 0xEB01, 0x2BC0, 0x2A80,
-                0xEA41, 0xEE01, 0x2EC0, 0x2F80, 0xEF41, 0x2D00, 0xEDC1, 0xEC81,
-                0x2C40, 0xE401, 0x24C0, 0x2580, 0xE541, 0x2700, 0xE7C1, 0xE681,
-                0x2640, 0x2200, 0xE2C1, 0xE381, 0x2340, 0xE101, 0x21C0, 0x2080,
-                0xE041, 0xA001, 0x60C0, 0x6180, 0xA141, 0x6300, 0xA3C1, 0xA281,
-                0x6240, 0x6600, 0xA6C1, 0xA781, 0x6740, 0xA501, 0x65C0, 0x6480,
-                0xA441, 0x6C00, 0xACC1, 0xAD81, 0x6D40, 0xAF01, 0x6FC0, 0x6E80,
-                0xAE41, 0xAA01, 0x6AC0, 0x6B80, 0xAB41, 0x6900, 0xA9C1, 0xA881,
-                0x6840, 0x7800, 0xB8C1, 0xB981, 0x7940, 0xBB01, 0x7BC0, 0x7A80,
-                0xBA41, 0xBE01, 0x7EC0, 0x7F80, 0xBF41, 0x7D00, 0xBDC1, 0xBC81,
-                0x7C40, 0xB401, 0x74C0, 0x7580, 0xB541, 0x7700, 0xB7C1, 0xB681,
-                0x7640, 0x7200, 0xB2C1, 0xB381, 0x7340, 0xB101, 0x71C0, 0x7080,
-                0xB041, 0x5000, 0x90C1, 0x9181, 0x5140, 0x9301, 0x53C0, 0x5280,
-                0x9241, 0x9601, 0x56C0, 0x5780, 0x9741, 0x5500, 0x95C1, 0x9481,
-                0x5440, 0x9C01, 0x5CC0, 0x5D80, 0x9D41, 0x5F00, 0x9FC1, 0x9E81,
-                0x5E40, 0x5A00, 0x9AC1, 0x9B81, 0x5B40, 0x9901, 0x59C0, 0x5880,
-                0x9841, 0x8801, 0x48C0, 0x4980, 0x8941, 0x4B00, 0x8BC1, 0x8A81,
-                0x4A40, 0x4E00, 0x8EC1, 0x8F81, 0x4F40, 0x8D01, 0x4DC0, 0x4C80,
-                0x8C41, 0x4400, 0x84C1, 0x8581, 0x4540, 0x8701, 0x47C0, 0x4680,
-                0x8641, 0x8201, 0x42C0, 0x4380, 0x8341, 0x4100, 0x81C1, 0x8081,
-                0x4040)
-    crcValue=0x0000
-    for b in buffer:
-        idx = (crcValue ^ b) & 0xFF
-        crcValue = ((crcValue >> 8) & 0xFF) ^ crc16tab[idx]
-    return crcValue
+    return crc16arcUpdate(0x0000,buffer)
+
+
+class Crc16Arc(object):
+    """
+    Crc16Arc computes the CRC-16/ARC of data fed by chunks
+    (buffers or files) without concatenating them
+    """
+    def __init__(self,buffer=None):
+        self.crc=0x0000
+        self.length=0
+        if buffer is not None:
+            self.update(buffer)
+
+    def update(self,buffer):
+        view=_bytesView(buffer)
+        self.crc=crc16arcUpdate(self.crc,view)
+        self.length+=len(view)
+        return self
+
+    def updateFile(self,fd,blocksize=1 << 20):
+        # read the file by blocks into a single reusable buffer
+        block=bytearray(blocksize)
+        view=memoryview(block)
+        n=fd.readinto(block)
+        while n:
+            self.update(view[:n])
+            n=fd.readinto(block)
+        return self
+
+    def digest(self):
+        return self.crc
 
+    def copy(self):
+        other=Crc16Arc()
+        other.crc=self.crc
+        other.length=self.length
+        return other
@@ -1,11 +1,46 @@
 import struct
 import json
+import sys
+import bisect
+import threading
+import itertools
 import re
+from array import array
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional: struct codec is used instead
+    np = None
+# minimal mean number of items per run of the same type for the numpy codec,
+# faster than struct only when each field converts a long block of items
+NUMPY_RUN_ITEMS=100
 
 # corresponds to CFE file primary header and to TBL secondary header
 HEADER_ENCODING="8I32s3I40s"
+# compiled header for big endian (True) and little endian (False) conventions
+HEADER_STRUCT={True:struct.Struct(">"+HEADER_ENCODING),False:struct.Struct("<"+HEADER_ENCODING)}
+HEADER_SIZE=HEADER_STRUCT[True].size
+# index of the header fields in the decoded header
+HEADER_OFFSET=10
+HEADER_NUMBYTES=11
+HEADER_TABLENAME=12
+
+# interned copy of the ranges shared by many items (numerical limits, enumerations)
+_SHARED_RANGES={}
+
+def sharedRange(key,build):
+    # range of key, built once then shared by all the items of all the definitions
+    value=_SHARED_RANGES.get(key)
+    if value is None:
+        value=_SHARED_RANGES[key]=build()
+    return value
+
 
 class TableDefinitionGenericItem(object):
+    # attributes only, no per item __dict__: large definitions have many items
+    __slots__=("name","datatype","defaultvalue","description","length","datarange",
+               "editable","displaytype","encoding","offset","count")
+
     def __init__(self):
         self.name=""
         self.datatype=""
@@ -17,10 +52,15 @@ class TableDefinitionGenericItem(object):
         self.displaytype=""
         self.encoding="B"
         self.offset=0
+        self.count=1
 
     def parse(self,data):
+        # unknown keys of the JSON item are ignored, strings are interned
+        # as names, descriptions and datatypes repeat across items and definitions
         for key,value in data.items():
-            setattr(self,key.lower(),value)
+            key=key.lower()
+            if key in _ITEM_ATTRIBUTES:
+                setattr(self,key,sys.intern(value) if type(value)==type(str()) else value)
 
     def display(self,value):
         return str(value)
@@ -31,6 +71,14 @@ class TableDefinitionGenericItem(object):
     def bytesSize(self):
         return struct.calcsize(">"+self.encoding)
 
+    def fieldsCount(self):
+        # number of struct fields used by the item encoding
+        return len(struct.unpack(">"+self.encoding,bytes(self.bytesSize())))
+
+    def dtypeEncoding(self,convention):
+        # numpy type of the item
+        return convention+self.encoding
+
     def maxi(self):
         pass
 
@@ -47,7 +95,11 @@ class TableDefinitionGenericItem(object):
         return str(value)
 
 
+_ITEM_ATTRIBUTES=frozenset(TableDefinitionGenericItem.__slots__)
+
 class TableDefinitionUint8Item(TableDefinitionGenericItem):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionUint8Item,self).__init__()
         self.datatype="uint8"
@@ -62,7 +114,7 @@ class TableDefinitionUint8Item(TableDefinitionGenericItem):
 
     def parse(self,data):
         super(TableDefinitionUint8Item,self).parse(data)
-        self.datarange=[self.mini(),self.maxi()]
+        self.datarange=sharedRange((type(self),self.encoding),lambda:[self.mini(),self.maxi()])
 
     def cast(self,valuestr):
         if type(valuestr)==type(str()):
@@ -70,7 +122,7 @@ class TableDefinitionUint8Item(TableDefinitionGenericItem):
                 return eval(valuestr)
             elif valuestr!='':
                 v=int(valuestr)
-                if v<0:
+                if v<self.mini():
                     return None
                 else:
                     return v
@@ -90,6 +142,8 @@ class TableDefinitionUint8Item(TableDefinitionGenericItem):
 
 class TableDefinitionUint24Item(TableDefinitionUint8Item):
     # for padding 24 bits
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionUint24Item,self).__init__()
         self.datatype="uint24"
@@ -102,8 +156,14 @@ class TableDefinitionUint24Item(TableDefinitionUint8Item):
     def encode(self,value):
         return (0,0)
 
+    def dtypeEncoding(self,convention):
+        # only the first byte is decoded, the 2 next bytes stay at zero
+        return "u1"
+
 
 class TableDefinitionInt8Item(TableDefinitionUint8Item):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionInt8Item,self).__init__()
         self.datatype="int8"
@@ -116,24 +176,32 @@ class TableDefinitionInt8Item(TableDefinitionUint8Item):
         return -128
 
 class TableDefinitionUint16Item(TableDefinitionUint8Item):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionUint16Item,self).__init__()
         self.datatype="uint16"
         self.encoding="H"
 
 class TableDefinitionUint32Item(TableDefinitionUint8Item):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionUint32Item,self).__init__()
         self.datatype="uint32"
         self.encoding="I"
 
 class TableDefinitionUint64Item(TableDefinitionUint8Item):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionUint64Item,self).__init__()
         self.datatype="uint64"
         self.encoding="Q"
 
 class TableDefinitionFloatItem(TableDefinitionUint8Item):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionFloatItem,self).__init__()
         self.datatype="float"
@@ -155,12 +223,16 @@ class TableDefinitionFloatItem(TableDefinitionUint8Item):
         return float(value)
 
 class TableDefinitionFloat16Item(TableDefinitionFloatItem):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionFloat16Item,self).__init__()
         self.datatype="float16"
         self.encoding="e"
 
 class TableDefinitionLongFloatItem(TableDefinitionFloatItem):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionLongFloatItem,self).__init__()
         self.datatype="longfloat"
@@ -174,6 +246,8 @@ class TableDefinitionLongFloatItem(TableDefinitionFloatItem):
 
 
 class TableDefinitionStringItem(TableDefinitionGenericItem):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionStringItem,self).__init__()
         self.datatype="string"
@@ -185,6 +259,9 @@ class TableDefinitionStringItem(TableDefinitionGenericItem):
     def encode(self,valuestr):
         return bytes(valuestr,"utf-8")
 
+    def dtypeEncoding(self,convention):
+        return "S{0}".format(self.length)
+
     def decode(self,value):
         if type(value)==type(bytes()):
             return value.decode("utf-8").replace("\x00","")
@@ -192,6 +269,8 @@ class TableDefinitionStringItem(TableDefinitionGenericItem):
             return value
 
 class TableDefinitionEnum8Item(TableDefinitionGenericItem):
+    __slots__=("reverse",)
+
     def __init__(self):
         super(TableDefinitionEnum8Item,self).__init__()
         self.datatype="enum8"
@@ -199,8 +278,9 @@ class TableDefinitionEnum8Item(TableDefinitionGenericItem):
 
     def parse(self,data):
         super(TableDefinitionEnum8Item,self).parse(data)
-        self.datarange={"{0} [{1}]".format(k,v):v for k,v in self.datarange.items()}
-        self.reverse={v:k for k,v in self.datarange.items()}
+        key=tuple(self.datarange.items())
+        self.datarange=sharedRange(key,lambda:{"{0} [{1}]".format(k,v):v for k,v in key})
+        self.reverse=sharedRange(("reverse",)+key,lambda:{v:k for k,v in self.datarange.items()})
 
     def cast(self,valuestr):
         if type(valuestr)==type(str()):
@@ -218,19 +298,115 @@ class TableDefinitionEnum8Item(TableDefinitionGenericItem):
         return int(value)
 
 class TableDefinitionEnum32Item(TableDefinitionEnum8Item):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionEnum32Item,self).__init__()
         self.datatype="enum32"
         self.encoding="I"
 
 class TableDefinitionEnum16Item(TableDefinitionEnum8Item):
+    __slots__=()
+
     def __init__(self):
         super(TableDefinitionEnum16Item,self).__init__()
         self.datatype="enum16"
         self.encoding="H"
 
 
+class TableDefinitionArrayElement(object):
+    """
+    TableDefinitionArrayElement is one row of an item repeated "count" times,
+    created on access by TableDefinitionItems. It shares all the attributes
+    of the repeated item except its name (suffixed by #index), its offset and
+    its default value
+    """
+    __slots__=("run","index")
+
+    def __init__(self,run,index):
+        self.run=run
+        self.index=index
+
+    @property
+    def name(self):
+        return "{0}#{1}".format(self.run.name,self.index)
+
+    @property
+    def offset(self):
+        return self.run.offset+self.index*self.run.bytesSize()
+
+    @property
+    def defaultvalue(self):
+        value=self.run.defaultvalue
+        return value[self.index] if type(value)==type(list()) else value
+
+    def __getattr__(self,attr):
+        if attr in TableDefinitionArrayElement.__slots__:
+            raise AttributeError(attr)
+        return getattr(self.run,attr)
+
+
+class TableDefinitionItems(object):
+    """
+    TableDefinitionItems is the sequence of the rows of a table definition.
+    An item repeated "count" times is kept once as a block of rows: each
+    row only refers to the item, the TableDefinitionArrayElement of a row
+    is created on access from its index in the block
+    """
+    __slots__=("rows","starts")
+
+    def __init__(self):
+        # item of each row
+        self.rows=[]
+        # first row of each repeated item
+        self.starts=[]
+
+    def append(self,item):
+        if item.count>1:
+            self.starts.append(len(self.rows))
+        self.rows.extend([item]*item.count)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self,index):
+        if type(index)==type(slice(0)):
+            return [self[i] for i in range(*index.indices(len(self.rows)))]
+        item=self.rows[index]
+        if item.count>1:
+            if index<0:
+                index+=len(self.rows)
+            start=self.starts[bisect.bisect_right(self.starts,index)-1]
+            return TableDefinitionArrayElement(item,index-start)
+        return item
+
+    def __iter__(self):
+        for row,item,count in self.blocks():
+            if count>1:
+                yield from (TableDefinitionArrayElement(item,i) for i in range(count))
+            else:
+                yield item
+
+    def blocks(self):
+        # (first row,item,number of rows) of each item of the definition
+        rows=self.rows
+        row=0
+        while row<len(rows):
+            item=rows[row]
+            yield row,item,item.count
+            row+=item.count
+
+
+def itemBlocks(items):
+    # (first row,item,number of rows) of a sequence of items, repeated items as one block if known
+    if isinstance(items,TableDefinitionItems):
+        return items.blocks()
+    return ((row,item,1) for row,item in enumerate(items))
+
+
 class TableDefinitionItemFactory(object):
+    _shared=None
+
     def __init__(self):
         self.definitionlist=[TableDefinitionUint8Item,TableDefinitionUint16Item,
                             TableDefinitionUint32Item,TableDefinitionFloatItem,
@@ -245,26 +421,326 @@ class TableDefinitionItemFactory(object):
                            'double':TableDefinitionLongFloatItem,
                            'raw24':TableDefinitionUint24Item})
 
+    @classmethod
+    def shared(cls):
+        # the factory is stateless: one instance is shared by all the definitions
+        if cls._shared is None:
+            cls._shared=cls()
+        return cls._shared
+
     def datatypes(self):
         return sorted(self.tdefs.keys())
 
     def create(self,data):
-        tdg=TableDefinitionGenericItem()
-        tdg.parse(data)
-        m=re.match("^char(\d+)",tdg.datatype)
-        if m:
-            tdg.datatype='string'
-            tdg.length=m.group(1)
+        datatype=""
+        for key,value in data.items():
+            if key.lower()=="datatype":
+                datatype=value
+        if re.match("^char(\d+)",datatype):
+            datatype='string'
         try:
-            tdef=self.tdefs[tdg.datatype]()
+            tdef=self.tdefs[datatype]()
             tdef.parse(data)
-            return tdef
         except KeyError:
             return None
+        # repeated item: one block of rows in TableDefinitionItems, encoded as one run
+        if type(tdef.count)!=type(int()) or tdef.count<1:
+            return None
+        # a list of default values gives one value per element
+        if type(tdef.defaultvalue)==type(list()) and len(tdef.defaultvalue)!=tdef.count:
+            return None
+        return tdef
+
+class TableDefinitionCodec(object):
+    """
+    TableDefinitionCodec contains, for one endianness convention,
+     - the struct.Struct compiled once from the items encoding
+     - the mapping between the values list and the struct fields
+    """
+    def __init__(self,items,bigendian=True):
+        convention=">" if bigendian else "<"
+        self.convention=convention
+        self.items=items
+        self.header=HEADER_STRUCT[bigendian]
+        # first struct field of each item
+        self.fields=array('q')
+        # byte position of each item in the buffer
+        self.positions=array('q')
+        # items using several struct fields (uint24 padding)
+        self.multi=[]
+        # items decoded from bytes (strings)
+        self.strings=[]
+        # (start,stop) items following each other with the same numerical encoding
+        self.runs=[]
+        fmt=[]
+        n=0
+        position=0
+        previous=None
+        # a repeated item is added as one block of rows
+        for i,item,rows in itemBlocks(items):
+            size=item.bytesSize()
+            count=item.fieldsCount()
+            self.fields.extend(range(n,n+rows*count,count))
+            self.positions.extend(range(position,position+rows*size,size))
+            position+=rows*size
+            if count>1:
+                self.multi.extend(range(i,i+rows))
+            if item.datatype=="string":
+                self.strings.extend(range(i,i+rows))
+            mergeable=count==1 and item.datatype!="string"
+            if mergeable and item.encoding==previous:
+                self.runs[-1][1]=i+rows
+            elif mergeable:
+                self.runs.append([i,i+rows])
+            else:
+                self.runs.extend([j,j+1] for j in range(i,i+rows))
+            previous=item.encoding if mergeable else None
+            fmt.append((item.encoding,rows))
+            n+=rows*count
+        self.struct=struct.Struct(convention+compactEncoding(fmt))
+        self.size=self.struct.size
+
+    def decode(self,buffer):
+        data=self.struct.unpack_from(buffer)
+        if self.multi:
+            result=[data[i] for i in self.fields]
+        else:
+            result=list(data)
+        for i in self.strings:
+            result[i]=self.items[i].decode(result[i])
+        return result
+
+    def encode(self,values):
+        data=[item.encode(value) for item,value in zip(self.items,values)]
+        for i in reversed(self.multi):
+            data[i:i+1]=data[i]
+        buffer=bytearray(self.size)
+        self.struct.pack_into(buffer,0,*data)
+        return buffer
+
+    def encodeItem(self,index,value):
+        # bytes of the value of one item
+        item=self.items[index]
+        x=item.encode(value)
+        if index in self.multi:
+            return struct.pack(self.convention+item.encoding,*x)
+        return struct.pack(self.convention+item.encoding,x)
+
+    def decodeItem(self,index,buffer):
+        # value of one item, decoded at its position in the buffer
+        item=self.items[index]
+        value=struct.unpack_from(self.convention+item.encoding,buffer,self.positions[index])[0]
+        if item.datatype=="string":
+            value=item.decode(value)
+        return value
+
+    def slice(self,items,start,stop):
+        """
+        codec of the headers followed by the items start to stop (the items of a
+        TableDefinitionRange), sliced from this codec: only the struct format of
+        the runs in the range is compiled again
+        """
+        header=items.header
+        codec=object.__new__(type(self))
+        codec.__dict__.update(self.__dict__)
+        codec.items=items
+        shift=start-header
+        codec.positions=self.positions[:header]
+        codec.fields=self.fields[:header]
+        if start<stop:
+            position=self.positions[start]-self.positions[header]
+            field=self.fields[start]-self.fields[header]
+            codec.positions.extend(p-position for p in self.positions[start:stop])
+            codec.fields.extend(f-field for f in self.fields[start:stop])
+        codec.multi=sliceRows(self.multi,header,start,stop)
+        codec.strings=sliceRows(self.strings,header,start,stop)
+        # runs of the headers, then the runs overlapping start to stop, clipped
+        runs=self.runs
+        first=max(bisect.bisect_right(runs,[start,sys.maxsize])-1,0)
+        codec.runs=[[a,min(b,header)] for a,b in runs[:bisect.bisect_left(runs,[header])]]
+        codec.runs.extend([max(a,start)-shift,min(b,stop)-shift] for a,b in runs[first:bisect.bisect_left(runs,[stop])])
+        codec.struct=struct.Struct(self.convention+compactEncoding((items[a].encoding,b-a) for a,b in codec.runs))
+        codec.size=codec.struct.size
+        return codec
+
+
+def sliceRows(rows,header,start,stop):
+    # sorted rows of the headers and of start to stop, as rows of the headers followed by start to stop
+    return (rows[:bisect.bisect_left(rows,header)]+
+            [i-start+header for i in rows[bisect.bisect_left(rows,start):bisect.bisect_left(rows,stop)]])
+
+
+# value of TableDefinitionValues not decoded yet
+_UNDECODED=object()
+
+class TableDefinitionValues(object):
+    """
+    TableDefinitionValues is a values list decoded lazily from the table buffer:
+    each value is decoded on first access then kept, the strings being
+    decoded at once to report encoding errors on opening.
+    Iterating decodes all the remaining values in one codec call.
+    The buffer rows must not change before their value is set or decoded.
+    """
+    def __init__(self,codec,buffer):
+        if len(buffer)<codec.size:
+            raise struct.error("unpack_from requires a buffer of at least {0} bytes".format(codec.size))
+        self.codec=codec
+        self.buffer=buffer
+        self.values=[_UNDECODED]*len(codec.items)
+        for i in codec.strings:
+            self.values[i]=codec.decodeItem(i,buffer)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self,index):
+        if type(index)==type(slice(0)):
+            return [self[i] for i in range(*index.indices(len(self.values)))]
+        value=self.values[index]
+        if value is _UNDECODED:
+            value=self.values[index]=self.codec.decodeItem(index,self.buffer)
+        return value
+
+    def __setitem__(self,index,value):
+        self.values[index]=value
+
+    def __iter__(self):
+        self.decodeAll()
+        return iter(self.values)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def invalidate(self,start,stop):
+        # rows start to stop changed in the buffer: decoded again on access, strings at once
+        self.values[start:stop]=[_UNDECODED]*(stop-start)
+        strings=self.codec.strings
+        for i in strings[bisect.bisect_left(strings,start):bisect.bisect_left(strings,stop)]:
+            self.values[i]=self.codec.decodeItem(i,self.buffer)
+
+    def decodeAll(self):
+        if self.buffer is None:
+            return
+        decoded=self.codec.decode(self.buffer)
+        self.values=[new if value is _UNDECODED else value for value,new in zip(self.values,decoded)]
+        # every value is known, the buffer is not needed anymore
+        self.buffer=None
+
+    def copy(self):
+        return list(self)
+
+
+def compactEncoding(encodings):
+    """
+    struct format of the (encoding,count) list, consecutive identical fields
+    as a run "{n}I": encodings of several fields (uint24) or strings ("8s")
+    are repeated
+    """
+    fmt=[]
+    previous=None
+    n=0
+    for encoding,count in encodings:
+        if encoding==previous and len(encoding)==1:
+            n+=count
+        else:
+            if previous:
+                fmt.append("{0}{1}".format(n,previous) if n>1 else previous)
+            if len(encoding)==1:
+                previous,n=encoding,count
+            else:
+                fmt.append(encoding*count)
+                previous,n=None,0
+    if previous:
+        fmt.append("{0}{1}".format(n,previous) if n>1 else previous)
+    return "".join(fmt)
+
+
+class TableDefinitionNumpyCodec(TableDefinitionCodec):
+    """
+    TableDefinitionNumpyCodec decodes and encodes the whole table as one
+    record of a numpy structured dtype instead of a struct.Struct.
+    Consecutive items of the same numerical type (runs) are merged in one
+    sub-array field, converted in one block: each field costs a python call,
+    so this codec is only faster than struct for long runs (NUMPY_RUN_ITEMS).
+    """
+    def __init__(self,items,bigendian=True,codec=None):
+        # the struct codec of the items, if already built, is reused
+        if codec is not None:
+            self.__dict__.update(codec.__dict__)
+        else:
+            super(TableDefinitionNumpyCodec,self).__init__(items,bigendian)
+        self._dtype=None
+
+    @property
+    def dtype(self):
+        # built on the first whole table decode or encode, not needed for single items
+        if self._dtype is None:
+            formats=[]
+            for start,stop in self.runs:
+                encoding=self.items[start].dtypeEncoding(self.convention)
+                formats.append((encoding,(stop-start,)) if stop-start>1 else encoding)
+            self._dtype=np.dtype({"names":["f{0}".format(i) for i in range(len(formats))],
+                                  "formats":formats,"offsets":[self.positions[start] for start,stop in self.runs],
+                                  "itemsize":self.size})
+        return self._dtype
+
+    def decode(self,buffer):
+        if len(buffer)<self.size:
+            raise struct.error("unpack_from requires a buffer of at least {0} bytes".format(self.size))
+        record=np.frombuffer(buffer,dtype=self.dtype,count=1)[0]
+        result=[]
+        for name,(start,stop) in zip(self.dtype.names,self.runs):
+            if stop-start>1:
+                result.extend(record[name].tolist())
+            else:
+                result.append(record[name].item())
+        for i in self.strings:
+            result[i]=self.items[i].decode(result[i])
+        return result
+
+    def encode(self,values):
+        data=list(values)
+        if len(data)<len(self.items):
+            raise struct.error("pack_into expected {0} items".format(len(self.items)))
+        for i in self.strings:
+            data[i]=self.items[i].encode(data[i])
+        for i in self.multi:
+            data[i]=0
+        record=np.zeros(1,dtype=self.dtype)
+        try:
+            for name,(start,stop) in zip(self.dtype.names,self.runs):
+                record[name][0]=data[start:stop] if stop-start>1 else data[start]
+        except (ValueError,TypeError,OverflowError) as err:
+            raise struct.error(str(err))
+        return bytearray(record.tobytes())
+
+    def slice(self,items,start,stop):
+        codec=super(TableDefinitionNumpyCodec,self).slice(items,start,stop)
+        codec._dtype=None
+        return codec
+
+
+def itemsDtype(items,bigendian=True):
+    # numpy structured dtype of the items, each field at its position in the table buffer
+    convention=">" if bigendian else "<"
+    formats=[]
+    offsets=[]
+    position=0
+    for item in items:
+        formats.append(item.dtypeEncoding(convention))
+        offsets.append(position)
+        position+=item.bytesSize()
+    return np.dtype({"names":["f{0}".format(i) for i in range(len(formats))],
+                     "formats":formats,"offsets":offsets,"itemsize":position})
+
 
 class TableDefinition(object):
     def __init__(self,filename=None):
-        self.items = []
+        self.items = TableDefinitionItems()
+        self._codecs = {}
+        self._names = None
+        self._positions = None
+        self._search = None
         self.loadJSON(filename)
         self.saved=False
 
@@ -273,20 +749,23 @@ class TableDefinition(object):
             fid=open(filename,'r')
             listjson=json.load(fid)
             fid.close()
-            tdif=TableDefinitionItemFactory()
+            tdif=TableDefinitionItemFactory.shared()
             for itemdata in listjson:
                 item=tdif.create(itemdata)
                 if item:
-                    item.defaultvalue=item.cast(item.defaultvalue)
+                    if type(item.defaultvalue)==type(list()):
+                        item.defaultvalue=[item.cast(v) for v in item.defaultvalue]
+                    else:
+                        item.defaultvalue=item.cast(item.defaultvalue)
                     self.items.append(item)
                 else:
                     raise TypeError(itemdata)
+            # Update Offset in bytes for each item
+            self.setOffset()
             # Define the number of Bytes to be loaded
             # assume to be total size - header size
             idx=self.findIndex("NumBytes")
-            self.items[idx].defaultvalue=self.bytesSize()-struct.calcsize(HEADER_ENCODING)
-            # Update Offset in bytes for each item
-            self.setOffset()
+            self.items[idx].defaultvalue=self.bytesSize()-HEADER_SIZE
         self.filename=filename
         self.saved=True
 
@@ -297,97 +776,419 @@ class TableDefinition(object):
         return self.items[self.findIndex("TableName")].defaultvalue
 
     def findIndex(self,name):
-        res=[i for i,item in enumerate(self.items) if item.name.lower()==name.lower()]
-        return res[0] if len(res) else None
+        return self.findIndices([name])[0]
+
+    def findIndices(self,names):
+        # index of each name (None if not found), "name#i" being the element i of a repeated item
+        index,repeated=self.names()
+        rows=[]
+        for name in names:
+            name=name.lower()
+            row=index.get(name)
+            if row is None and repeated:
+                base,sep,element=name.rpartition("#")
+                start=repeated.get(base)
+                if start is not None and element.isdigit() and str(int(element))==element:
+                    if int(element)<self.items.rows[start].count:
+                        row=start+int(element)
+            rows.append(row)
+        return rows
+
+    def names(self):
+        """
+        case insensitive name to index dictionaries, built on first lookup:
+        the items not repeated, and the first row of the repeated items
+        """
+        if self._names is None:
+            index,repeated={},{}
+            for row,item,count in itemBlocks(self.items):
+                (repeated if count>1 else index).setdefault(item.name.lower(),row)
+            self._names=index,repeated
+        return self._names
 
     def get(self,attr):
         return [getattr(item,attr) for item in self.items]
 
     def getdefaultvalues(self):
-        return [item.defaultvalue for item in self.items]
+        values=[]
+        for row,item,count in itemBlocks(self.items):
+            value=item.defaultvalue
+            if count>1:
+                values.extend(value if type(value)==type(list()) else [value]*count)
+            else:
+                values.append(value)
+        return values
 
     def bytesSize(self):
-        return sum([item.bytesSize() for item in self.items])
+        return self.position(len(self.items))
 
     def setOffset(self):
+        # offset of each item, the elements of a repeated item following its offset
         offset=0
-        headersize=struct.calcsize(HEADER_ENCODING)
-        for i in range(len(self.items)):
-            self.items[i].offset=offset-headersize
-            offset+=self.items[i].bytesSize()
+        for row,item,count in itemBlocks(self.items):
+            item.offset=offset-HEADER_SIZE
+            offset+=count*item.bytesSize()
+        # items layout changed: codecs, names and positions index have to be built again
+        self._codecs={}
+        self._names=None
+        self._positions=None
+        self._search=None
         return True
 
+    def search(self,text,within=None):
+        # rows whose name or description contains text (case insensitive), index built on first search
+        if self._search is None:
+            self._search=TableDefinitionSearch(self.items)
+        return self._search.search(text,within)
+
+    def positions(self):
+        # byte position of each item in the table followed by the table size, built on first use
+        if self._positions is None:
+            positions=array('q',[0])
+            for row,item,count in itemBlocks(self.items):
+                size=item.bytesSize()
+                positions.extend(range(positions[-1]+size,positions[-1]+count*size+1,size))
+            self._positions=positions
+        return self._positions
+
+    def position(self,row):
+        # byte position of the item row in the table binary, the table size for the last row+1
+        return self.positions()[row]
+
+    def rowAt(self,offset):
+        # row of the item containing the byte at offset (as item.offset, negative in the headers), else None
+        row=bisect.bisect_right(self.positions(),HEADER_SIZE+offset)-1
+        return row if 0<=row<len(self.items) else None
+
+    def span(self,start,stop):
+        # (offset,nbytes) of the items start to stop (excluded), offset as item.offset
+        return self.position(start)-HEADER_SIZE,self.position(stop)-self.position(start)
+
+    def headerCount(self):
+        # number of items in the table headers
+        return bisect.bisect_left(self.positions(),HEADER_SIZE,0,len(self.items))
+
+    def itemsRange(self,offset,nbytes,lo=None,hi=None):
+        # (start,stop) items loaded by a partial table: from the first item at offset
+        # or after, up to nbytes, searched between the items lo and hi
+        positions=self.positions()
+        lo=self.headerCount() if lo is None else lo
+        hi=len(self.items) if hi is None else hi
+        start=bisect.bisect_left(positions,HEADER_SIZE+offset,lo,hi)
+        stop=bisect.bisect_right(positions,positions[start]+nbytes,start,hi+1)-1
+        return start,stop
+
+    def codec(self,bigendian=True):
+        # compiled codec, cached for each endianness convention
+        # struct codec by default, numpy codec only for long runs of items of the same type
+        codec=self._codecs.get(bigendian)
+        if codec is None:
+            codec=TableDefinitionCodec(self.items,bigendian)
+            if np is not None and len(codec.runs)*NUMPY_RUN_ITEMS<=len(self.items):
+                codec=TableDefinitionNumpyCodec(self.items,bigendian,codec)
+            self._codecs[bigendian]=codec
+        return codec
+
+    def to_dtype(self,bigendian=True):
+        # numpy structured dtype of the complete table (headers included)
+        if np is None:
+            raise ImportError("numpy is required to build the table dtype")
+        return itemsDtype(self.items,bigendian)
+
     def reduceTo(self,offset,nbytes):
-        partial=TableDefinition()
+        # definition of the partial table loaded at offset on nbytes, and the indexes of its items:
+        # a TableDefinitionRange sharing the items and codec, or the definition itself if complete
         if not nbytes:
             nbytes=self.items[self.findIndex("NumBytes")].defaultvalue
-        totalbytes=0
-        indexes=[]
-        for idx,item in enumerate(self.items):
-            if item.offset<0:
-                partial.items.append(item)
-                indexes.append(idx)
-            elif (item.offset>=offset and (totalbytes+item.bytesSize())<=nbytes):
-                partial.items.append(item)
-                indexes.append(idx)
-                totalbytes += item.bytesSize()
-        partial.filename=self.filename
-        idx = partial.findIndex("NumBytes")
-        partial.items[idx].defaultvalue = partial.bytesSize() - struct.calcsize(HEADER_ENCODING)
-        idx = partial.findIndex("Offset")
-        partial.items[idx].defaultvalue = offset
-        return partial,indexes
-
-    def decode(self,buffer,bigendian=True):
-        convention =">" if bigendian else "<"
-        fmt=[convention]
-        fmt.extend([item.encoding for item in self.items])
-        data=list(struct.unpack("".join(fmt),buffer[:self.bytesSize()]))
-        result=[]
-        i=0
-        for item in self.items:
-            if item.datatype=="string":
-                result.append(item.decode(data[i]))
-                i+=1
-            elif isinstance(item,TableDefinitionUint24Item):
-                result.append(data[i])
-                i+=2
-            else:
-                result.append(data[i])
-                i+=1
-        return result
+        start,stop=self.itemsRange(offset,nbytes)
+        header=self.headerCount()
+        indexes=TableDefinitionRangeItems(range(len(self.items)),header,start,stop)
+        if start==header and stop==len(self.items):
+            return self,indexes
+        return TableDefinitionRange(self,start,stop,offset),indexes
+
+    def decode(self,buffer,bigendian=True,lazy=False):
+        # values list, or TableDefinitionValues decoded on access if lazy
+        if lazy:
+            return TableDefinitionValues(self.codec(bigendian),buffer)
+        return self.codec(bigendian).decode(buffer)
 
     def encode(self,values,bigendian=True):
-        convention =">" if bigendian else "<"
-        buffer = bytearray()
         try:
-            for item,value in zip(self.items,values):
-                x=item.encode(value)
-                if isinstance(item,TableDefinitionUint24Item):
-                    buffer.extend(struct.pack(convention +item.encoding ,*x))
-                else:
-                    buffer.extend(struct.pack(convention + item.encoding, x))
-            return buffer
+            return self.codec(bigendian).encode(values)
         except struct.error:
             return None
 
     def decodeHeader(self,buffer,bigendian=True):
-        convention =">" if bigendian else "<"
-        header=convention+HEADER_ENCODING
-        headersize=struct.calcsize(header)
-        if len(buffer) >= headersize:
-            data=list(struct.unpack(header,buffer[:headersize]))
-            return data
+        header=HEADER_STRUCT[bigendian]
+        if len(buffer) >= header.size:
+            return list(header.unpack_from(buffer))
         else:
             return None
 
     def decodeTableName(self,buffer,bigendian=True):
         data=self.decodeHeader(buffer,bigendian)
-        return data[12].decode("utf-8").replace("\x00","") if data else None
+        return data[HEADER_TABLENAME].decode("utf-8").replace("\x00","") if data else None
 
     def decodeOffsetAndNumBytes(self,buffer,bigendian=True):
         data=self.decodeHeader(buffer,bigendian)
-        return (data[10],data[11]) if data else None
+        return (data[HEADER_OFFSET],data[HEADER_NUMBYTES]) if data else None
+
+    def __getstate__(self):
+        # compiled codecs and names index are rebuilt after unpickling
+        state=self.__dict__.copy()
+        state["_codecs"]={}
+        state["_names"]=None
+        state["_positions"]=None
+        state["_search"]=None
+        return state
 
     def __repr__(self):
         return '\n'.join(['{0}\t{1}'.format(item.name,item.defaultvalue) for item in self.items])
+
+
+# words of the names and descriptions indexed by TableDefinitionSearch
+SEARCH_WORD=re.compile(r"\w+")
+
+class TableDefinitionSearch(object):
+    """
+    TableDefinitionSearch finds the items whose name or description contains
+    a text (case insensitive) without scanning all the items:
+     - the distinct words of the names and descriptions are indexed by trigram,
+       with the rows of the items using each word
+     - each word of the text is searched in the distinct words, and only the
+       items having all these words are compared to the text
+    """
+    def __init__(self,items):
+        self.items=items
+        rows={}
+        for row,item in enumerate(items):
+            for word in set(SEARCH_WORD.findall("{0} {1}".format(item.name,item.description).lower())):
+                postings=rows.get(word)
+                if postings is None:
+                    postings=rows[word]=array('i')
+                postings.append(row)
+        self.words=list(rows)
+        self.rows=[rows[word] for word in self.words]
+        # trigram -> index of the words having it
+        self.trigrams={}
+        for i,word in enumerate(self.words):
+            for j in range(len(word)-2):
+                postings=self.trigrams.get(word[j:j+3])
+                if postings is None:
+                    postings=self.trigrams[word[j:j+3]]=array('i')
+                if not postings or postings[-1]!=i:
+                    postings.append(i)
+
+    def wordRows(self,text):
+        # rows of the items having a word containing text
+        if len(text)>=3:
+            candidates=None
+            for j in range(len(text)-2):
+                postings=self.trigrams.get(text[j:j+3])
+                if postings is None:
+                    return set()
+                candidates=set(postings) if candidates is None else candidates.intersection(postings)
+        else:
+            candidates=range(len(self.words))
+        rows=set()
+        for i in candidates:
+            if text in self.words[i]:
+                rows.update(self.rows[i])
+        return rows
+
+    def search(self,text,within=None):
+        """
+        sorted rows whose name or description contains text.
+        within: rows already found for a part of text, the only ones checked
+        """
+        text=text.lower()
+        if within is None:
+            words=set(SEARCH_WORD.findall(text))
+            if max(map(len,words),default=0)>=3:
+                # short words are left to the final comparison
+                words=[word for word in words if len(word)>=3]
+            for word in words:
+                rows=self.wordRows(word)
+                within=rows if within is None else within&rows
+                if not within:
+                    return []
+            if within is None:
+                within=range(len(self.items))
+        items=self.items
+        return sorted(row for row in within if text in items[row].name.lower() or
+                      text in str(items[row].description).lower())
+
+
+class TableDefinitionRangeItems(object):
+    """
+    TableDefinitionRangeItems is the sequence of the headers items then of
+    the items start to stop of a parent sequence, without copy
+    """
+    __slots__=("parent","header","start","stop")
+
+    def __init__(self,parent,header,start,stop):
+        self.parent=parent
+        self.header=header
+        self.start=start
+        self.stop=stop
+
+    def __len__(self):
+        return self.header+self.stop-self.start
+
+    def parentIndex(self,index):
+        # index in the parent sequence of the index in the range
+        if index<0:
+            index+=len(self)
+        if index<0 or index>=len(self):
+            raise IndexError("range index out of range")
+        return index if index<self.header else index-self.header+self.start
+
+    def __getitem__(self,index):
+        if type(index)==type(slice(0)):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.parent[self.parentIndex(index)]
+
+    def __iter__(self):
+        return map(self.parent.__getitem__,itertools.chain(range(self.header),range(self.start,self.stop)))
+
+
+class TableDefinitionRange(TableDefinition):
+    """
+    TableDefinitionRange is the definition of a partial table (Offset/NumBytes):
+    the headers then the items start to stop of a parent TableDefinition.
+    The items are shared with the parent and never modified: the Offset and
+    NumBytes default values of the partial table are kept by the range.
+    """
+    def __init__(self,parent,start,stop,offset):
+        self.parent=parent
+        self.start=start
+        self.stop=stop
+        self.offset=offset
+        self.items=TableDefinitionRangeItems(parent.items,parent.headerCount(),start,stop)
+        self._codecs={}
+        self._names=None
+        self._positions=None
+        self._search=None
+        self.filename=parent.filename
+        self.saved=parent.saved
+
+    def dataSize(self):
+        positions=self.parent.positions()
+        return positions[self.stop]-positions[self.start]
+
+    def getdefaultvalues(self):
+        values=super(TableDefinitionRange,self).getdefaultvalues()
+        values[self.parent.findIndex("NumBytes")]=self.dataSize()
+        values[self.parent.findIndex("Offset")]=self.offset
+        return values
+
+    def headerCount(self):
+        return self.items.header
+
+    def position(self,row):
+        # position in the partial table binary: the items start to stop follow the headers
+        positions=self.parent.positions()
+        header=self.items.header
+        if row<=header:
+            return positions[row]
+        return positions[header]+positions[self.start+row-header]-positions[self.start]
+
+    def rowAt(self,offset):
+        row=self.parent.rowAt(offset)
+        if row is None or row<self.items.header:
+            return row
+        return row-self.start+self.items.header if self.start<=row<self.stop else None
+
+    def span(self,start,stop):
+        # offset in the complete table: shifted by the items before start
+        offset,nbytes=super(TableDefinitionRange,self).span(start,stop)
+        if start>=self.items.header:
+            positions=self.parent.positions()
+            offset+=positions[self.start]-positions[self.items.header]
+        return offset,nbytes
+
+    def setOffset(self):
+        # the items offsets are the ones of the parent table
+        return False
+
+    def codec(self,bigendian=True):
+        codec=self._codecs.get(bigendian)
+        if codec is None:
+            codec=self.parent.codec(bigendian).slice(self.items,self.start,self.stop)
+            self._codecs[bigendian]=codec
+        return codec
+
+    def reduceTo(self,offset,nbytes):
+        # range of the parent inside this range, indexes in this range
+        if not nbytes:
+            nbytes=self.dataSize()
+        start,stop=self.parent.itemsRange(offset,nbytes,self.start,self.stop)
+        header=self.items.header
+        indexes=TableDefinitionRangeItems(range(len(self.items)),header,
+                                          header+start-self.start,header+stop-self.start)
+        if start==self.start and stop==self.stop and offset==self.offset:
+            return self,indexes
+        return TableDefinitionRange(self.parent,start,stop,offset),indexes
+
+
+def readTableName(text):
+    # TableName of a JSON table definition, parsing the items only up to the TableName item
+    decoder=json.JSONDecoder()
+    separator=re.compile(r"[\s,]*")
+    idx=separator.match(text,0).end()
+    if text[idx:idx+1]!="[":
+        raise ValueError("table definition is not a list of items")
+    idx=separator.match(text,idx+1).end()
+    while idx<len(text) and text[idx]!="]":
+        data,idx=decoder.raw_decode(text,idx)
+        if type(data)!=type(dict()):
+            raise TypeError(data)
+        # keys are case insensitive, as in TableDefinitionGenericItem.parse
+        name=[value for key,value in data.items() if key.lower()=="name"]
+        if name and str(name[-1]).lower()=="tablename":
+            item=TableDefinitionItemFactory.shared().create(data)
+            if item is None:
+                raise TypeError(data)
+            return item.defaultvalue
+        idx=separator.match(text,idx).end()
+    raise TypeError("no TableName item")
+
+
+class LazyTableDefinition(object):
+    """
+    LazyTableDefinition only knows the TableName of a table definition file.
+    The complete TableDefinition is built by loader(filename) on the first
+    access to any other attribute, once under lock whatever the threads using it.
+    """
+    def __init__(self,filename,tablename,loader=TableDefinition,lock=None):
+        self.filename=filename
+        self.tablename=tablename
+        self.loader=loader
+        self.lock=lock if lock is not None else threading.Lock()
+        self.tabledef=None
+
+    def getTableName(self):
+        return self.tablename
+
+    def isLoaded(self):
+        return self.tabledef is not None
+
+    def materialize(self):
+        if self.tabledef is None:
+            with self.lock:
+                # checked again: built by another thread while waiting for the lock
+                if self.tabledef is None:
+                    self.tabledef=self.loader(self.filename)
+        return self.tabledef
+
+    def __getattr__(self,attr):
+        if attr in ("filename","tablename","loader","lock","tabledef"):
+            raise AttributeError(attr)
+        return getattr(self.materialize(),attr)
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __repr__(self):
+        return repr(self.materialize())
@@ -0,0 +1,134 @@
+import os
+import pickle
+import hashlib
+from TableDefinition import TableDefinition
+
+CACHE_FILENAME="TableDefinition-{0}.cache"
+# to be incremented when TableDefinition or items attributes change
+CACHE_VERSION=6
+
+def userCacheDirectory():
+    # cache directory of the current user, never shared with the other users of the definitions
+    if os.name=="nt":
+        base=os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base=os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"),".cache")
+    return os.path.join(base,"TableManager")
+
+
+class TableDefinitionCache(object):
+    """
+    TableDefinitionCache keeps the parsed tables definition of a directory
+    in a pickle file of the user cache directory: a pickle file can run code
+    when loaded, so it is never read from the shared definitions directory.
+    Each entry is keyed by the JSON file path and checked against its
+    modification time, size and content hash: only the changed JSON files
+    are parsed again.
+    The TableName of each file is stored apart from its pickled
+    TableDefinition, which is only unpickled when the table is used.
+    """
+    def __init__(self,dirname,cachedir=None):
+        # one cache file per definitions directory
+        key=hashlib.sha1(os.path.abspath(dirname).encode("utf-8")).hexdigest()
+        self.filename=os.path.join(cachedir or userCacheDirectory(),CACHE_FILENAME.format(key))
+        # path -> (mtime,size,hash,TableName,pickled TableDefinition or None)
+        self.entries={}
+        self.used=set()
+        self.modified=False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.filename,'rb') as fd:
+                version,entries=pickle.load(fd)
+            if version==CACHE_VERSION and type(entries)==type(dict()):
+                self.entries=entries
+        except Exception:
+            # missing, unreadable or incompatible cache: everything is parsed again
+            self.entries={}
+
+    def save(self):
+        # write the cache if it changed, only with the entries used since loading
+        if not self.modified and set(self.entries)<=self.used:
+            return True
+        entries={path:entry for path,entry in self.entries.items() if path in self.used}
+        tmpname="{0}.{1}.tmp".format(self.filename,os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.filename),mode=0o700,exist_ok=True)
+            with open(tmpname,'wb') as fd:
+                pickle.dump((CACHE_VERSION,entries),fd,pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname,self.filename)
+        except OSError:
+            return False
+        self.entries=entries
+        self.modified=False
+        return True
+
+    def fileHash(self,filename):
+        with open(filename,'rb') as fd:
+            return hashlib.sha1(fd.read()).hexdigest()
+
+    def entry(self,filename):
+        # up to date entry of filename, else None
+        path=os.path.abspath(filename)
+        self.used.add(path)
+        try:
+            stat=os.stat(path)
+            mtime,size,digest,tablename,data=self.entries[path]
+            if size==stat.st_size:
+                if mtime==stat.st_mtime_ns:
+                    return self.entries[path]
+                if digest==self.fileHash(path):
+                    # file touched or copied without change
+                    self.entries[path]=(stat.st_mtime_ns,size,digest,tablename,data)
+                    self.modified=True
+                    return self.entries[path]
+        except (KeyError,TypeError,ValueError,OSError):
+            # no entry or bad entry
+            pass
+        return None
+
+    def lookupName(self,filename):
+        # TableName of filename if the cache is up to date, else None
+        entry=self.entry(filename)
+        return entry[3] if entry else None
+
+    def lookup(self,filename):
+        # TableDefinition of filename if the cache is up to date, else None
+        entry=self.entry(filename)
+        if entry is None or entry[4] is None:
+            return None
+        try:
+            tdef=pickle.loads(entry[4])
+            if isinstance(tdef,TableDefinition):
+                return tdef
+        except Exception:
+            pass
+        # bad entry: filename is parsed again
+        del self.entries[os.path.abspath(filename)]
+        self.modified=True
+        return None
+
+    def store(self,filename,tdef):
+        path=os.path.abspath(filename)
+        stat=os.stat(path)
+        self.used.add(path)
+        data=pickle.dumps(tdef,pickle.HIGHEST_PROTOCOL)
+        self.entries[path]=(stat.st_mtime_ns,stat.st_size,self.fileHash(path),tdef.getTableName(),data)
+        self.modified=True
+
+    def storeName(self,filename,tablename,digest):
+        # only the TableName is known, the file is not parsed yet
+        path=os.path.abspath(filename)
+        stat=os.stat(path)
+        self.used.add(path)
+        self.entries[path]=(stat.st_mtime_ns,stat.st_size,digest,tablename,None)
+        self.modified=True
+
+    def loadDefinition(self,filename):
+        # TableDefinition of filename, from the cache if it is up to date, else parsed
+        tdef=self.lookup(filename)
+        if tdef is None:
+            tdef=TableDefinition(filename)
+            self.store(filename,tdef)
+        return tdef
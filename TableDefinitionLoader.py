@@ -0,0 +1,115 @@
+import os
+import hashlib
+import threading
+import concurrent.futures
+from TableDefinition import LazyTableDefinition,readTableName
+from TableDefinitionCache import TableDefinitionCache
+
+def parseDefinitionName(filename):
+    # executed in a worker thread: (TableName,content hash) or error message
+    try:
+        with open(filename,'rb') as fd:
+            content=fd.read()
+        return (readTableName(content.decode("utf-8")),hashlib.sha1(content).hexdigest()),None
+    except (TypeError,ValueError,KeyError,OSError) as err:
+        return None,"{0}: {1}".format(type(err).__name__,err)
+
+
+class TableDefinitionLoader(object):
+    """
+    TableDefinitionLoader loads all the tables definition (.json) of a directory.
+    Only the TableName of each file is read (from the cache or from the header
+    items, in a pool of threads) and LazyTableDefinition are returned, parsed
+    on first use.
+    The results are merged in files name order, so that TableName collisions
+    are always solved the same way: the first file defining a TableName wins.
+    """
+    def __init__(self,dirname,workers=None,cachedir=None):
+        self.dirname=dirname
+        self.workers=workers if workers else os.cpu_count() or 1
+        # user cache directory by default
+        self.cachedir=cachedir
+        self.tablesdefinition={}
+        self.origin={}
+        self.cache=None
+        self.cachesaved=True
+        # the cache is shared with the lazy definitions, materialized from another thread
+        self.lock=threading.RLock()
+        self.interrupted=False
+
+    def files(self):
+        return sorted(file for file in os.listdir(self.dirname) if file.endswith(".json"))
+
+    def parseNames(self,filenames):
+        # iterator of ((TableName,hash),error) in filenames order, read by threads (I/O bound)
+        if len(filenames)>1:
+            with concurrent.futures.ThreadPoolExecutor(min(4*self.workers,len(filenames))) as executor:
+                for result in executor.map(parseDefinitionName,filenames):
+                    yield result
+        else:
+            for filename in filenames:
+                yield parseDefinitionName(filename)
+
+    def materialize(self,filename):
+        # complete TableDefinition of a lazy table definition, stored in the cache
+        with self.lock:
+            tdef=self.cache.loadDefinition(filename)
+            self.cachesaved=self.cache.save()
+        return tdef
+
+    def interrupt(self):
+        # stop definitions() before the next file
+        self.interrupted=True
+
+    def lookup(self,filename):
+        name=self.cache.lookupName(filename)
+        return LazyTableDefinition(filename,name,self.materialize,self.lock) if name is not None else None
+
+    def definitions(self):
+        """
+        iterator of (file,TableDefinition,error message) for each .json file,
+        the TableDefinition being None in case of error
+        """
+        self.tablesdefinition={}
+        self.origin={}
+        self.interrupted=False
+        files=self.files()
+        paths=[os.path.join(self.dirname,file) for file in files]
+        with self.lock:
+            self.cache=TableDefinitionCache(self.dirname,self.cachedir)
+            tdefs=[self.lookup(path) for path in paths]
+        missing=[i for i,tdef in enumerate(tdefs) if tdef is None]
+        parsed=self.parseNames([paths[i] for i in missing])
+        pending=iter(missing)
+        nextmissing=next(pending,None)
+        for i,file in enumerate(files):
+            if self.interrupted:
+                parsed.close()
+                break
+            tdef,error=tdefs[i],None
+            if i==nextmissing:
+                result,error=next(parsed)
+                if result is None:
+                    tdef=None
+                else:
+                    name,digest=result
+                    with self.lock:
+                        self.cache.storeName(paths[i],name,digest)
+                    tdef=LazyTableDefinition(paths[i],name,self.materialize,self.lock)
+                nextmissing=next(pending,None)
+            if tdef is not None:
+                name=tdef.getTableName()
+                if name in self.origin:
+                    tdef,error=None,"TableName {0} already defined in file {1}".format(name,self.origin[name])
+                else:
+                    self.tablesdefinition[name]=tdef
+                    self.origin[name]=file
+            yield file,tdef,error
+        if not self.interrupted:
+            with self.lock:
+                self.cachesaved=self.cache.save()
+
+    def load(self):
+        # dictionary of TableName->TableDefinition and list of (file,error message)
+        errors=[(file,error) for file,tdef,error in self.definitions() if error]
+        return self.tablesdefinition,errors
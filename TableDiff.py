@@ -0,0 +1,194 @@
+"""
+TableDiff: item level differences between two binary images (.tbl files)
+of the same table definition.
+
+The images are compared by chunks, in the positions of the complete table
+given by their Offset/NumBytes headers: the equal chunks are skipped, the
+items of the differing chunks are compared one by one and only the items
+found different are decoded.
+The differing items of an edited table give the smallest set of partial
+tables (Offset/NumBytes loads) to be sent to update a baseline, and the
+partial tables are applied onto a complete image as on board.
+This module never imports Qt.
+"""
+import os
+import mmap
+import bisect
+from TableDefinition import *
+
+# bytes compared at once: the differing chunks are compared again by blocks,
+# the items are only compared in the differing blocks
+DIFF_CHUNK=4096
+DIFF_BLOCK=64
+
+
+class TableImageRows(object):
+    """
+    TableImageRows are the items of a complete table definition contained
+    in a binary image: the headers, then the data items start to stop
+    loaded at Offset (up to NumBytes and to the image size)
+    """
+    def __init__(self,tabledef,image,bigendian=True):
+        header=tabledef.decodeHeader(image,bigendian)
+        if header is None:
+            raise struct.error("image shorter than the table headers")
+        rangedef,indexes=tabledef.reduceTo(header[HEADER_OFFSET],header[HEADER_NUMBYTES])
+        positions=tabledef.positions()
+        self.image=image
+        self.header=tabledef.headerCount()
+        self.start=indexes.start
+        # position in the complete table minus shift = position in the image
+        self.shift=positions[self.start]-positions[self.header]
+        # items truncated by the end of the image are not loaded
+        end=bisect.bisect_right(positions,len(image)+self.shift,self.start)-1
+        self.stop=max(self.start,min(indexes.stop,end))
+        self.codec=rangedef.codec(bigendian)
+
+    def value(self,row):
+        # decoded value of the item row of the complete table
+        if row>=self.header:
+            row=self.header+row-self.start
+        return self.codec.decodeItem(row,self.image)
+
+
+def differingSpans(image,other,start,end,shift=0,othershift=0,sizes=(DIFF_CHUNK,DIFF_BLOCK)):
+    # (position,size) of the differing spans between start and end, by decreasing sizes
+    for pos in range(start,end,sizes[0]):
+        size=min(sizes[0],end-pos)
+        if image[pos-shift:pos-shift+size]!=other[pos-othershift:pos-othershift+size]:
+            if len(sizes)>1 and size>sizes[1]:
+                yield from differingSpans(image,other,pos,pos+size,shift,othershift,sizes[1:])
+            else:
+                yield pos,size
+
+
+def differingRows(positions,image,other,first,stop,shift=0,othershift=0):
+    # rows first to stop (excluded) whose bytes differ, positions being shifted in each image
+    rows=[]
+    row=first
+    for pos,size in differingSpans(image,other,positions[first],positions[stop],shift,othershift):
+        # items overlapping the span, the ones before row were compared with the previous span
+        row=max(row,bisect.bisect_right(positions,pos)-1)
+        while row<stop and positions[row]<pos+size:
+            itemstart,itemstop=positions[row],positions[row+1]
+            if image[itemstart-shift:itemstop-shift]!=other[itemstart-othershift:itemstop-othershift]:
+                rows.append(row)
+            row+=1
+    return rows
+
+
+def completeDefinition(tabledef):
+    # complete TableDefinition of a lazy or partial table definition
+    if isinstance(tabledef,LazyTableDefinition):
+        tabledef=tabledef.materialize()
+    if isinstance(tabledef,TableDefinitionRange):
+        tabledef=tabledef.parent
+    return tabledef
+
+
+def diffRows(tabledef,image,other,bigendian=True,headers=True):
+    """
+    (rows,image rows,other image rows): rows of the complete table definition
+    differing between two images of tabledef, and the TableImageRows of each
+    image. Only the headers (if headers) and the data items loaded by both
+    images are compared.
+    """
+    tabledef=completeDefinition(tabledef)
+    positions=tabledef.positions()
+    rowsA=TableImageRows(tabledef,image,bigendian)
+    rowsB=TableImageRows(tabledef,other,bigendian)
+    rows=differingRows(positions,image,other,0,rowsA.header) if headers else []
+    start,stop=max(rowsA.start,rowsB.start),min(rowsA.stop,rowsB.stop)
+    if start<stop:
+        rows+=differingRows(positions,image,other,start,stop,rowsA.shift,rowsB.shift)
+    return rows,rowsA,rowsB
+
+
+def diffImages(tabledef,image,other,bigendian=True):
+    """
+    list of (row,value,other value) of the items differing between two images
+    of tabledef, rows of the complete table definition.
+    Only the headers and the data items loaded by both images are compared.
+    """
+    rows,rowsA,rowsB=diffRows(tabledef,image,other,bigendian)
+    return [(row,rowsA.value(row),rowsB.value(row)) for row in rows]
+
+
+def mergeSpans(positions,rows,overhead=HEADER_SIZE):
+    """
+    (offset,nbytes) of the partial tables loading the sorted rows: each partial
+    table costs overhead (its headers) plus its bytes, so two spans are merged
+    when the bytes between them cost less than the headers of another table
+    """
+    spans=[]
+    for row in rows:
+        start,stop=positions[row],positions[row+1]
+        if spans and start-spans[-1][1]<=overhead:
+            spans[-1][1]=stop
+        else:
+            spans.append([start,stop])
+    return [(start-HEADER_SIZE,stop-start) for start,stop in spans]
+
+
+def partialLoads(tabledef,baseline,image,bigendian=True):
+    """
+    (offset,nbytes) of the smallest set of partial tables updating baseline
+    to image, ValueError if baseline doesn't contain all the items of image
+    """
+    tabledef=completeDefinition(tabledef)
+    rows,rowsA,rowsB=diffRows(tabledef,baseline,image,bigendian,headers=False)
+    if rowsA.start>rowsB.start or rowsA.stop<rowsB.stop:
+        raise ValueError("baseline doesn't contain all the items of the table")
+    return mergeSpans(tabledef.positions(),rows)
+
+
+def loadSpan(tabledef,load,bigendian=True):
+    """
+    (position,nbytes) of the data of a partial table image load in the complete
+    image of tabledef: ValueError if load is not a table of tabledef or if its
+    Offset/NumBytes are not inside the table data
+    """
+    header=tabledef.decodeHeader(load,bigendian)
+    if header is None:
+        raise struct.error("partial table shorter than the table headers")
+    tblname=header[HEADER_TABLENAME].decode("utf-8").replace("\x00","")
+    if tblname!=tabledef.getTableName():
+        raise ValueError("partial table {0} is not a {1} table".format(tblname,tabledef.getTableName()))
+    offset,nbytes=header[HEADER_OFFSET],header[HEADER_NUMBYTES]
+    datasize=tabledef.bytesSize()-HEADER_SIZE
+    if nbytes==0 or offset+nbytes>datasize:
+        raise ValueError("Offset {0} NumBytes {1} of partial table {2} outside the {3} bytes of the table".format(offset,nbytes,tblname,datasize))
+    if len(load)<HEADER_SIZE+nbytes:
+        raise ValueError("partial table {0} shorter than its NumBytes {1}".format(tblname,nbytes))
+    return HEADER_SIZE+offset,nbytes
+
+
+def readImage(filename):
+    # read-only memory map of filename, struct.error if empty
+    with open(filename,'rb') as fd:
+        try:
+            return mmap.mmap(fd.fileno(),0,access=mmap.ACCESS_READ)
+        except ValueError:
+            raise struct.error("empty file {0}".format(os.path.basename(filename)))
+
+
+def diffFiles(filename,othername,tablesdefinition,bigendian=True):
+    """
+    (table definition,differences) between two .tbl files of the same TableName,
+    tablesdefinition being the dictionary TableName->TableDefinition.
+    struct.error if a file is not a .tbl file, ValueError if the TableNames
+    differ or have no table definition
+    """
+    with readImage(filename) as image, readImage(othername) as other:
+        names=[TableDefinition().decodeTableName(buffer,bigendian) for buffer in (image,other)]
+        for name,file in zip(names,(filename,othername)):
+            if name is None:
+                raise struct.error("file {0} is not TBL file".format(file))
+        if names[0]!=names[1]:
+            raise ValueError("TableName {0} of {1} differs from {2} of {3}".format(names[0],filename,names[1],othername))
+        if names[0] not in tablesdefinition:
+            raise ValueError("No table definition available for table name '{0}'".format(names[0]))
+        tabledef=tablesdefinition[names[0]]
+        if isinstance(tabledef,LazyTableDefinition):
+            tabledef=tabledef.materialize()
+        return tabledef,diffImages(tabledef,image,other,bigendian)
@@ -0,0 +1,160 @@
+import sys
+import struct
+from array import array
+
+# default maximum memory used by the history of one table (bytes)
+HISTORY_MEMORY=16*1024*1024
+
+# kind of a stored value
+_INT=0
+_FLOAT=1
+_OBJECT=2
+_DOUBLE=struct.Struct("d")
+_LONG=struct.Struct("q")
+# bytes used by one entry in the typed arrays: row, kinds and values before/after
+_ENTRY_SIZE=8+2*1+2*8
+_STEP_SIZE=8
+
+class TableHistory(object):
+    """
+    TableHistory is the undo/redo history of the values of a TableObject.
+    Each step (edit, paste) is a list of entries (row, value before, value after)
+    stored in typed arrays: integers and floats as 64 bits values, the other
+    values (strings) in a list of objects.
+     - consecutive edits of the same cell are merged in one step
+     - the oldest steps are forgotten when the history uses more than "memory" bytes
+    """
+    def __init__(self,table,memory=HISTORY_MEMORY):
+        self.table=table
+        self.memory=memory
+        self.clear()
+
+    def clear(self):
+        self.rows=array('q')
+        # 2 per entry: before, after
+        self.kinds=array('b')
+        self.values=array('q')
+        self.objects=[]
+        self.objectsize=0
+        # first entry of each step
+        self.steps=array('q')
+        # steps applied to the table
+        self.position=0
+
+    def __len__(self):
+        return len(self.steps)
+
+    def canUndo(self):
+        return self.position>0
+
+    def canRedo(self):
+        return self.position<len(self.steps)
+
+    def size(self):
+        # estimated memory used by the history (bytes)
+        return len(self.rows)*_ENTRY_SIZE+len(self.steps)*_STEP_SIZE+self.objectsize
+
+    def pack(self,value):
+        # (kind,64 bits value) of a value
+        if type(value)==type(int()) and -(1<<63)<=value<(1<<63):
+            return _INT,value
+        if type(value)==type(float()):
+            return _FLOAT,_LONG.unpack(_DOUBLE.pack(value))[0]
+        self.objects.append(value)
+        self.objectsize+=sys.getsizeof(value)
+        return _OBJECT,len(self.objects)-1
+
+    def unpack(self,kind,value):
+        if kind==_INT:
+            return value
+        if kind==_FLOAT:
+            return _DOUBLE.unpack(_LONG.pack(value))[0]
+        return self.objects[value]
+
+    def entries(self,step):
+        # (row,before,after) of each entry of the step
+        start=self.steps[step]
+        stop=self.steps[step+1] if step+1<len(self.steps) else len(self.rows)
+        return [(self.rows[i],self.unpack(self.kinds[2*i],self.values[2*i]),
+                 self.unpack(self.kinds[2*i+1],self.values[2*i+1])) for i in range(start,stop)]
+
+    def record(self,changes):
+        # new step of (row,previous value,value) changes, already set in the table
+        if not changes:
+            return
+        self.truncate()
+        if len(changes)==1 and self.position>0:
+            start=self.steps[-1]
+            if len(self.rows)-start==1 and self.rows[start]==changes[0][0]:
+                # same cell edited again: only the value after changes,
+                # the object of the previous value after is the last one stored
+                if self.kinds[2*start+1]==_OBJECT:
+                    self.objectsize-=sys.getsizeof(self.objects.pop())
+                self.kinds[2*start+1],self.values[2*start+1]=self.pack(changes[0][2])
+                self.limit()
+                return
+        self.steps.append(len(self.rows))
+        for row,before,after in changes:
+            self.rows.append(row)
+            for value in (before,after):
+                kind,value=self.pack(value)
+                self.kinds.append(kind)
+                self.values.append(value)
+        self.position=len(self.steps)
+        self.limit()
+
+    def truncate(self):
+        # forget the steps undone, replaced by a new step
+        if self.position<len(self.steps):
+            cut=self.steps[self.position]
+            # the objects are stored in the entries order: the ones of the steps undone are the last ones
+            for kind,value in zip(self.kinds[2*cut:],self.values[2*cut:]):
+                if kind==_OBJECT:
+                    self.objectsize-=sum(sys.getsizeof(obj) for obj in self.objects[value:])
+                    del self.objects[value:]
+                    break
+            del self.rows[cut:]
+            del self.kinds[2*cut:]
+            del self.values[2*cut:]
+            del self.steps[self.position:]
+
+    def limit(self):
+        # forget the oldest steps (by quarters) while the history uses too much memory
+        while self.steps and self.size()>self.memory:
+            self.drop(max(1,min(self.position,len(self.steps)//4)))
+
+    def drop(self,count):
+        # forget the count oldest steps, the arrays and objects are compacted
+        cut=self.steps[count] if count<len(self.steps) else len(self.rows)
+        rows=self.rows[cut:]
+        kinds=self.kinds[2*cut:]
+        values=self.values[2*cut:]
+        objects=[]
+        for i,kind in enumerate(kinds):
+            if kind==_OBJECT:
+                objects.append(self.objects[values[i]])
+                values[i]=len(objects)-1
+        self.rows,self.kinds,self.values,self.objects=rows,kinds,values,objects
+        self.objectsize=sum(sys.getsizeof(value) for value in objects)
+        self.steps=array('q',(start-cut for start in self.steps[count:]))
+        self.position-=count
+
+    def undo(self):
+        # undo the last step applied: rows changed, None if nothing to undo
+        if not self.canUndo():
+            return None
+        self.position-=1
+        entries=self.entries(self.position)
+        for row,before,after in reversed(entries):
+            self.table.setValue(row,before)
+        return [row for row,before,after in entries]
+
+    def redo(self):
+        # apply again the last step undone: rows changed, None if nothing to redo
+        if not self.canRedo():
+            return None
+        entries=self.entries(self.position)
+        for row,before,after in entries:
+            self.table.setValue(row,after)
+        self.position+=1
+        return [row for row,before,after in entries]
@@ -5,16 +5,22 @@ from PyQt5.Qt import QApplication
 from functools import partial
 
 import sys
+import time
 import logging
 import configparser
 from TableObject import *
 from TableDefinition import *
+from TableDefinitionLoader import *
 from TableViewer import *
 
 CONFIG_FILENAME="TableManager.ini"
 README_FILENAME="README.md"
 LOGGING_FILENAME="TableManager.log"
 VERSION="1.1"
+# files opened or saved at once by threads, the other ones wait
+FILE_THREADS=max(2,QThread.idealThreadCount())
+# reference time for the startup measurements
+STARTUP_TIME=time.perf_counter()
 
 logging.basicConfig(filename=LOGGING_FILENAME,
                     format='%(asctime)s - %(message)s',
@@ -46,6 +52,158 @@ class TableManagerTextDialog(QDialog):
         self.setMinimumSize(500,500)
         self.adjustSize()
 
+class TableDiffDialog(QDialog):
+    """
+    Dialog listing the items differing between the current table and a file
+    """
+    def __init__(self,parent,title,differences,columns):
+        super(TableDiffDialog,self).__init__(parent)
+        self.setWindowTitle(title)
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("{0} items differ".format(len(differences))))
+        view=QTableView()
+        view.setModel(TableDiffModel(differences,columns,view))
+        view.resizeColumnsToContents()
+        layout.addWidget(view)
+        button=QDialogButtonBox(QDialogButtonBox.Ok )
+        button.accepted.connect(self.accept)
+        layout.addWidget(button)
+        self.setLayout(layout)
+        self.setMinimumSize(500,500)
+        self.adjustSize()
+
+class TableDefinitionLoaderThread(QThread):
+    """
+    Thread loading the tables definition of a directory,
+    each table definition being sent to the main window as soon as it is available
+    """
+    loaded=pyqtSignal(int,int,str,object,object)
+
+    def __init__(self,dirname,parent=None):
+        super(TableDefinitionLoaderThread,self).__init__(parent)
+        self.dirname=dirname
+        self.loader=TableDefinitionLoader(dirname)
+
+    def run(self):
+        total=len(self.loader.files())
+        for i,(file,tdef,error) in enumerate(self.loader.definitions()):
+            self.loaded.emit(i+1,total,file,tdef,error)
+
+    def stop(self):
+        self.loader.interrupt()
+        self.wait()
+
+class TableFileThread(QThread):
+    """
+    Thread opening or saving a table file out of the main window thread,
+    the progress (bytes done, total bytes) being sent to the main window.
+    process() does the operation, its errors are kept in error.
+    cancel() stops the operation after the current block.
+    """
+    progress=pyqtSignal(int,int)
+
+    def __init__(self,filename,parent=None):
+        super(TableFileThread,self).__init__(parent)
+        self.filename=filename
+        # cancel requested, operation really cancelled
+        self.interrupted=False
+        self.cancelled=False
+        self.error=None
+        self.done=0
+        self.total=0
+
+    def report(self,done,total):
+        self.done,self.total=done,total
+        self.progress.emit(done,total)
+        return not self.interrupted
+
+    def run(self):
+        # an exception raised out of run would abort the application: reported as error
+        try:
+            self.process()
+        except Exception as err:
+            self.error="ERROR processing file {0}: {1}".format(self.filename,err)
+
+    def process(self):
+        pass
+
+    def cancel(self):
+        # an operation already done is not cancelled
+        self.interrupted=True
+        if not self.isRunning() and not self.isFinished():
+            self.cancelled=True
+
+class TableOpenThread(TableFileThread):
+    """
+    Thread reading the TableName, the table definition if not parsed yet,
+    then decoding the table and computing its CRC
+    """
+    def __init__(self,filename,tablesdefinition,parent=None):
+        super(TableOpenThread,self).__init__(filename,parent)
+        # copy: the tables definition may change while the file is opened
+        self.tablesdefinition=dict(tablesdefinition)
+        self.tblname=None
+        self.table=None
+        # table definition file parsed by the thread
+        self.definitionfile=None
+
+    def process(self):
+        table=TableObject()
+        try:
+            self.tblname=table.decodeTableName(self.filename)
+        except struct.error:
+            self.error="ERROR file {0} is not TBL file".format(self.filename)
+            return
+        except OSError:
+            self.error="ERROR reading file {0}".format(self.filename)
+            return
+        if self.tblname is None:
+            self.error="ERROR file {0} is not TBL file".format(self.filename)
+            return
+        tdef=self.tablesdefinition.get(self.tblname)
+        if tdef is None:
+            return
+        if isinstance(tdef,LazyTableDefinition) and not tdef.isLoaded():
+            try:
+                tdef.materialize()
+                self.definitionfile=tdef.filename
+            except (TypeError,ValueError,KeyError,OSError) as err:
+                self.error="Uncorrect table definition in file {0}: {1}".format(tdef.filename,err)
+                return
+        table.loadTableDefinition(tdef)
+        try:
+            table.decode(self.filename,progress=self.report)
+            table.calculateCRC()
+            self.table=table
+        except OperationCancelled:
+            self.cancelled=True
+        except (struct.error,OSError):
+            self.error="ERROR reading file {0}".format(self.filename)
+
+class TableSaveThread(TableFileThread):
+    """
+    Thread writing the blocks encoded from a table in the main window thread
+    """
+    def __init__(self,model,tableview,filename,partial,blocks,parent=None,reopen=True):
+        super(TableSaveThread,self).__init__(filename,parent)
+        self.model=model
+        self.tableview=tableview
+        self.partial=partial
+        self.blocks=blocks
+        # a partial table is opened once saved
+        self.reopen=reopen
+
+    def process(self):
+        try:
+            self.model.write(self.filename,self.blocks,self.report)
+        except OperationCancelled:
+            self.cancelled=True
+        except OSError as err:
+            self.error="ERROR writing file {0}: {1}".format(self.filename,err)
+        finally:
+            # the blocks are not kept once written
+            self.blocks=None
+
 class TableManagerMain(QMainWindow):
     """
     TableManager Main Window manager
@@ -57,16 +215,29 @@ class TableManagerMain(QMainWindow):
         self.setStatusBar(self.statusbar)
         self.loadedfile=None
         self.tablesdefinition = {}
+        self.loaderthread=None
+        # files being opened or saved, started by FILE_THREADS at once
+        self.filethreads=[]
+        self.firstpaint=True
+        # undo history settings of the tables
+        self.history={}
         self.InitUI()
         self.InitMenu()
 
         self.logger=logging.getLogger("TableManager")
         self.logger.setLevel(logging.DEBUG)
+        # New menu update while tables definition are loading
+        self.menutimer=QTimer(self)
+        self.menutimer.setSingleShot(True)
+        self.menutimer.setInterval(100)
+        self.menutimer.timeout.connect(self.UpdateTablesDefinitionMenu)
 
         # Load Tables Definition from config file
         config = configparser.ConfigParser()
         if CONFIG_FILENAME in os.listdir():
             config.read(CONFIG_FILENAME)
+            if config.has_option('History','memory'):
+                self.history['memory']=config.getint('History','memory')
             dirname=config['TableDefinitionDir']['path']
             self.LoadTablesDefinition(dirname)
         else:
@@ -106,13 +277,31 @@ class TableManagerMain(QMainWindow):
         self.info.setReadOnly(True)
         self.info.setPlainText("No Table Selected")
 
+        # Filter of the current table rows
+        self.filter=QLineEdit(self)
+        self.filter.setPlaceholderText("Filter names and descriptions")
+        self.filter.setClearButtonEnabled(True)
+        self.filter.textChanged.connect(self.FilterTable)
+        layout.addWidget(self.filter)
+
         # Tabs view
         self.tabs=QTabWidget(self)
         self.tabs.setTabsClosable(True)
         self.tabs.tabCloseRequested.connect(self.CloseTab)
         self.tabs.currentChanged.connect(self.UpdateInfo)
+        self.tabs.currentChanged.connect(self.UpdateFilter)
         layout.addWidget(self.tabs)
 
+        # progress of the files being opened or saved
+        self.progressbar=QProgressBar(self)
+        self.progressbar.setMaximumWidth(150)
+        self.progressbar.hide()
+        self.statusbar.addPermanentWidget(self.progressbar)
+        self.cancelbutton=QPushButton("Cancel",self)
+        self.cancelbutton.clicked.connect(self.CancelFileThreads)
+        self.cancelbutton.hide()
+        self.statusbar.addPermanentWidget(self.cancelbutton)
+
     def InitMenu(self):
         """
         function to create the Menu File and About
@@ -146,6 +335,21 @@ class TableManagerMain(QMainWindow):
         self.saveAsAction.triggered.connect(self.SaveAs)
         filemenu.addAction(self.saveAsAction)
         self.saveAsAction.setEnabled(False)
+        # Partial loads Menu
+        self.loadsAction=QAction("Save &partial loads from baseline...",self)
+        self.loadsAction.triggered.connect(self.SavePartialLoads)
+        filemenu.addAction(self.loadsAction)
+        self.loadsAction.setEnabled(False)
+        # Apply partial loads Menu
+        self.applyAction=QAction("&Apply partial loads...",self)
+        self.applyAction.triggered.connect(self.ApplyPartialLoads)
+        filemenu.addAction(self.applyAction)
+        self.applyAction.setEnabled(False)
+        # Compare Table Menu
+        self.compareAction=QAction("&Compare with TBL file...",self)
+        self.compareAction.triggered.connect(self.Compare)
+        filemenu.addAction(self.compareAction)
+        self.compareAction.setEnabled(False)
         # --------- Change Tables Definition -----
         filemenu.addSeparator()
         changeAction = QAction("&Change Tables Definition directory...",self)
@@ -204,28 +408,67 @@ class TableManagerMain(QMainWindow):
             self.saveAsAction.setEnabled(True)
             self.saveAction.setEnabled(True)
             self.openAction.setEnabled(True)
+            self.compareAction.setEnabled(True)
+            self.loadsAction.setEnabled(True)
+            self.applyAction.setEnabled(True)
         else:
             self.saveAsAction.setEnabled(False)
             self.saveAction.setEnabled(False)
             self.openAction.setEnabled(False)
+            self.compareAction.setEnabled(False)
+            self.loadsAction.setEnabled(False)
+            self.applyAction.setEnabled(False)
         self.newSubMenu.setEnabled(True)
 
     def LoadTablesDefinition(self,dirname):
+        # tables definition are loaded by a thread, the menus are updated on the fly
+        self.StopLoadingTablesDefinition()
         self.tablesdefinition = {}
         if os.path.exists(dirname):
-            for file in os.listdir(dirname):
-                if file.endswith(".json"):
-                    self.logger.info("load table definition from file {0}".format(file))
-                    try:
-                        tdef=TableDefinition(os.path.join(dirname,file))
-                        self.tablesdefinition[tdef.getTableName()] = tdef
-                    except TypeError as err:
-                        self.statusbar.showMessage("Parsing error during file {0} reading".format(file))
-                        self.logger.error("Uncorrect table definition in file {0}".format(file))
-                        self.logger.error(err)
-            self.statusbar.showMessage("Loading {0} Tables Definition from {1}".format(len(self.tablesdefinition),dirname))
+            self.loadingstart=time.perf_counter()
+            self.statusbar.showMessage("Loading Tables Definition from {0}...".format(dirname))
+            self.loaderthread=TableDefinitionLoaderThread(dirname,self)
+            self.loaderthread.loaded.connect(self.TableDefinitionLoaded)
+            self.loaderthread.finished.connect(self.TablesDefinitionLoaded)
+            self.loaderthread.start()
         self.UpdateTablesDefinitionMenu()
 
+    def StopLoadingTablesDefinition(self):
+        if self.loaderthread:
+            self.loaderthread.loaded.disconnect()
+            self.loaderthread.finished.disconnect()
+            self.loaderthread.stop()
+            self.loaderthread=None
+
+    def TableDefinitionLoaded(self,i,total,file,tdef,error):
+        self.logger.info("load table name from file {0}".format(file))
+        if error:
+            self.statusbar.showMessage("Parsing error during file {0} reading".format(file))
+            self.logger.error("Uncorrect table definition in file {0}".format(file))
+            self.logger.error(error)
+        else:
+            self.tablesdefinition[tdef.getTableName()]=tdef
+            self.statusbar.showMessage("Loading Tables Definition {0}/{1}".format(i,total))
+            # menus are updated once per event loop iteration
+            if not self.menutimer.isActive():
+                self.menutimer.start()
+
+    def TablesDefinitionLoaded(self):
+        loader=self.loaderthread.loader
+        self.loaderthread=None
+        self.menutimer.stop()
+        self.UpdateTablesDefinitionMenu()
+        if not loader.cachesaved:
+            self.logger.warning("Tables Definition cache of {0} not saved".format(loader.dirname))
+        self.logger.info("{0} Tables Definition loaded in {1:.3f} s".format(len(self.tablesdefinition),time.perf_counter()-self.loadingstart))
+        self.statusbar.showMessage("Loading {0} Tables Definition from {1}".format(len(self.tablesdefinition),loader.dirname))
+
+    def paintEvent(self,event):
+        if self.firstpaint:
+            self.firstpaint=False
+            self.logger.info("first paint {0:.3f} s after startup".format(time.perf_counter()-STARTUP_TIME))
+        super(TableManagerMain,self).paintEvent(event)
+
     def ChangeTablesDefinition(self):
         idx=self.tabs.currentIndex()
         if idx!=-1:
@@ -239,6 +482,8 @@ class TableManagerMain(QMainWindow):
                     idx=self.tabs.currentIndex()
         dirname = str(QFileDialog().getExistingDirectory())
         config = configparser.ConfigParser()
+        # other sections of the config file are kept
+        config.read(CONFIG_FILENAME)
         config['TableDefinitionDir']={'path': dirname}
         config['Convention']={'bigendian':'True'}
         with open(CONFIG_FILENAME, 'w') as fd:
@@ -248,9 +493,9 @@ class TableManagerMain(QMainWindow):
 
     def CreateTable(self,table,name):
         # Table View creation
-        tableview=QTableView()
-        tablemodel=CustomTableModel(table)
-        tableview.setModel(tablemodel)
+        tableview=TableView()
+        tablemodel=CustomTableModel(table,history=self.history)
+        tableview.setModel(TableFilterModel(tablemodel,tableview))
         tableview.setItemDelegate(CustomDelegate())
         tableview.setSizeAdjustPolicy(QAbstractScrollArea.AdjustToContents)
         tableview.resizeColumnToContents(0)
@@ -260,11 +505,31 @@ class TableManagerMain(QMainWindow):
         selectionmodel.selectionChanged.connect(self.ChangeSelection)
         self.tabs.setCurrentIndex(self.tabs.addTab(tableview,name))
 
+    def TableModel(self,tableview):
+        # table model of a tab, under its filter model
+        return tableview.model().sourceModel()
+
+    def SelectedRows(self,tableview):
+        # sorted table rows selected in a tab
+        return tableview.model().sourceRows(tableview.selectionModel().selectedRows())
+
+    def FilterTable(self,text):
+        tableview=self.tabs.currentWidget()
+        if tableview:
+            tableview.model().setFilter(text)
+
+    def UpdateFilter(self,idx=None):
+        # filter text of the current tab
+        tableview=self.tabs.currentWidget()
+        self.filter.blockSignals(True)
+        self.filter.setText(tableview.model().text if tableview else "")
+        self.filter.blockSignals(False)
+
     def ChangeSelection(self,event=None):
         idx=self.tabs.currentIndex()
         tableview=self.tabs.widget(idx)
         if tableview:
-            selectedrows = [tableview.model().getItem(index.row()).offset for index in tableview.selectionModel().selectedRows()]
+            selectedrows = self.SelectedRows(tableview)
             n=len(selectedrows)
         else:
             n=0
@@ -279,7 +544,7 @@ class TableManagerMain(QMainWindow):
             idx=self.tabs.currentIndex()
         tableview = self.tabs.widget(idx)
         if tableview:
-            self.info.setPlainText(tableview.model().getInfo())
+            self.info.setPlainText(self.TableModel(tableview).getInfo())
             self.ChangeSelection(None)
         else:
             self.info.setPlainText("No Table Selected")
@@ -289,10 +554,33 @@ class TableManagerMain(QMainWindow):
         if filename:
             self.Save(filename)
 
+    def Compare(self,filename=None):
+        # items of the current table differing from a .tbl file
+        idx=self.tabs.currentIndex()
+        if idx==-1:
+            self.statusbar.showMessage("No table to compare")
+            return
+        if not filename:
+            filename = QFileDialog.getOpenFileName(self,caption="Compare with TBL File",filter="*.tbl")[0]
+        if filename:
+            name=self.tabs.tabText(idx)
+            try:
+                differences=self.TableModel(self.tabs.widget(idx)).diff(filename)
+            except (struct.error,ValueError,OSError) as err:
+                self.statusbar.showMessage(str(err))
+                self.logger.error(str(err))
+                return
+            msg="{0} items of table {1} differ from file {2}".format(len(differences),name,filename)
+            self.statusbar.showMessage(msg)
+            self.logger.info(msg)
+            dlg=TableDiffDialog(self,"Compare {0} with {1}".format(name,os.path.basename(filename)),
+                                differences,[name,os.path.basename(filename)])
+            dlg.exec()
+
     def CloseTab(self,idx):
         tableview=self.tabs.widget(idx)
         if tableview:
-            if tableview.model().isModified():
+            if self.TableModel(tableview).isModified():
                 dlg = QMessageBox(self)
                 dlg.setWindowTitle("File not saved")
                 dlg.setText("File not saved. Do you want to continue ?")
@@ -307,12 +595,11 @@ class TableManagerMain(QMainWindow):
     def CopyToClipboard(self):
         idx=self.tabs.currentIndex()
         tableview=self.tabs.widget(idx)
-        selectedrows=[index.row() for index in tableview.selectionModel().selectedRows()]
+        selectedrows=self.SelectedRows(tableview)
         clipboard=QApplication.clipboard()
         all=True
         if len(selectedrows) > 0:
-            s="\n".join(["{0}\t{1}".format(tableview.model().getItem(row).name,
-                             tableview.model().getValue(row))for row in selectedrows])
+            s=self.TableModel(tableview).copyText(selectedrows)
             msg="{0} items of table {1} copied to clipboard".format(len(selectedrows),self.tabs.tabText(idx))
             clipboard.setText(s)
             self.logger.info(msg)
@@ -324,24 +611,25 @@ class TableManagerMain(QMainWindow):
         itab=self.tabs.currentIndex()
         if itab!=-1:
             tableview=self.tabs.widget(itab)
-            model=tableview.model()
+            model=self.TableModel(tableview)
             clipboard=QApplication.clipboard()
             mimeData = clipboard.mimeData()
             if mimeData.hasText():
-                cnt=0
-                for line in mimeData.text().split('\n'):
-                    name,valuestr=line.split()
-                    idx=model.findIndex(name)
-                    if idx:
-                        logging.info("{0} found, value={1}".format(name,valuestr))
-                        if model.setData(model.index(idx,0),valuestr,Qt.EditRole):
-                            cnt+=1
-                        else:
-                            logging.error("{0} value error {1}".format(name,valuestr))
-                    else:
-                        logging.error("{0} not found".format(name),valuestr)
+                # "name<tab>value" lines, set as one undo command
+                pairs=[]
+                errors=[]
+                for line in mimeData.text().splitlines():
+                    fields=line.split("\t",1) if "\t" in line else line.split(None,1)
+                    if len(fields)==2:
+                        pairs.append((fields[0].strip(),fields[1]))
+                    elif line.strip():
+                        errors.append("bad line '{0}'".format(line))
+                cnt,valueerrors=model.setValues(pairs)
+                errors+=valueerrors
+                if errors:
+                    self.logger.error("{0} values not pasted: {1}".format(len(errors),", ".join(errors)))
                 msg="{0} values pasted".format(cnt)
-                logging.info(msg)
+                self.logger.info(msg)
                 self.statusbar.showMessage(msg)
 
     def Redo(self):
@@ -355,12 +643,28 @@ class TableManagerMain(QMainWindow):
         if itab != -1:
             tableview=self.tabs.widget(itab)
             if undo:
-                tableview.model().stack.undo()
+                self.TableModel(tableview).undo()
             else:
-                tableview.model().stack.redo()
+                self.TableModel(tableview).redo()
 
-    def New(self,tblname):
+    def GetTableDefinition(self,tblname):
+        # complete table definition, parsed on first use
         tdef=self.tablesdefinition[tblname]
+        if isinstance(tdef,LazyTableDefinition) and not tdef.isLoaded():
+            try:
+                tdef.materialize()
+                self.logger.info("load table definition from file {0}".format(tdef.filename))
+            except (TypeError,ValueError,KeyError,OSError) as err:
+                self.statusbar.showMessage("Parsing error during file {0} reading".format(os.path.basename(tdef.filename)))
+                self.logger.error("Uncorrect table definition in file {0}".format(tdef.filename))
+                self.logger.error(err)
+                return None
+        return tdef
+
+    def New(self,tblname):
+        tdef=self.GetTableDefinition(tblname)
+        if tdef is None:
+            return
         # create new tab
         table=TableObject(tdef)
         table.setCurrentTime()
@@ -368,38 +672,100 @@ class TableManagerMain(QMainWindow):
         self.logger.info("Create new table {0}".format(tblname))
 
     def Open(self):
-        filename = QFileDialog.getOpenFileName(filter="*.tbl")[0]
-        self.Open_file(filename)
+        # several files are opened in parallel
+        for filename in QFileDialog.getOpenFileNames(filter="*.tbl")[0]:
+            self.Open_file(filename)
 
     def Open_file(self,filename):
+        # the file is decoded by a thread, the tab is created by FileOpened
         if filename:
-            table=TableObject()
-            try:
-                tblname = table.decodeTableName(filename)
-                if not tblname in self.tablesdefinition:
-                    msg="No table definition available for table name '{0}'".format(tblname)
-                    self.statusbar.showMessage(msg)
-                    self.logger.error(msg)
-                else:
-                    table.loadTableDefinition(self.tablesdefinition[tblname])
-                    try:
-                        table.decode(filename)
-                        self.CreateTable(table,os.path.basename(filename))
-                        self.statusbar.showMessage("file {0} opened with {1} table definition".format(filename,tblname))
-                    except struct.error:
-                        msg="ERROR reading file {0}".format(filename)
-                        self.statusbar.showMessage(msg)
-                        self.logger.error(msg)
-            except struct.error:
-                msg="ERROR file {0} is not TBL file".format(filename)
-                self.statusbar.showMessage(msg)
-                self.logger.error(msg)
+            self.statusbar.showMessage("Opening file {0}...".format(filename))
+            self.StartFileThread(TableOpenThread(filename,self.tablesdefinition,self))
+
+    def FileOpened(self,thread):
+        filename,tblname=thread.filename,thread.tblname
+        if thread.definitionfile:
+            self.logger.info("load table definition from file {0}".format(thread.definitionfile))
+        if thread.cancelled:
+            msg="Opening of file {0} cancelled".format(filename)
+            self.statusbar.showMessage(msg)
+            self.logger.warning(msg)
+        elif thread.error:
+            self.statusbar.showMessage(thread.error)
+            self.logger.error(thread.error)
+        elif thread.table is None:
+            msg="No table definition available for table name '{0}'".format(tblname)
+            if self.loaderthread:
+                msg+=" (Tables Definition still loading)"
+            self.statusbar.showMessage(msg)
+            self.logger.error(msg)
+        else:
+            self.CreateTable(thread.table,os.path.basename(filename))
+            self.statusbar.showMessage("file {0} opened with {1} table definition".format(filename,tblname))
+
+    def StartFileThread(self,thread):
+        thread.progress.connect(self.UpdateProgress)
+        thread.finished.connect(partial(self.FileThreadFinished,thread))
+        self.filethreads.append(thread)
+        self.StartPendingThreads()
+        self.UpdateProgress()
+
+    def StartPendingThreads(self):
+        running=sum(1 for thread in self.filethreads if thread.isRunning())
+        for thread in self.filethreads:
+            if running>=FILE_THREADS:
+                break
+            if not thread.isRunning() and not thread.isFinished():
+                thread.start()
+                running+=1
+
+    def FileThreadFinished(self,thread):
+        if thread not in self.filethreads:
+            return
+        self.filethreads.remove(thread)
+        self.StartPendingThreads()
+        self.UpdateProgress()
+        if isinstance(thread,TableOpenThread):
+            self.FileOpened(thread)
+        else:
+            self.FileSaved(thread)
+
+    def UpdateProgress(self,done=None,total=None):
+        # progress of all the files being opened or saved
+        if not self.filethreads:
+            self.progressbar.hide()
+            self.cancelbutton.hide()
+            return
+        done=sum(thread.done for thread in self.filethreads)
+        total=sum(thread.total for thread in self.filethreads)
+        self.progressbar.setRange(0,1000)
+        self.progressbar.setValue(1000*done//total if total else 0)
+        self.progressbar.setFormat("{0} file(s) %p%".format(len(self.filethreads)))
+        self.progressbar.show()
+        self.cancelbutton.show()
+
+    def CancelFileThreads(self):
+        # the threads not started yet are finished at once
+        for thread in list(self.filethreads):
+            thread.cancel()
+            if not thread.isRunning() and not thread.isFinished():
+                self.FileThreadFinished(thread)
+
+    def StopFileThreads(self):
+        # the files being opened are cancelled, the files being saved are written
+        for thread in self.filethreads:
+            if isinstance(thread,TableOpenThread):
+                thread.cancel()
+            elif not thread.isRunning() and not thread.isFinished():
+                thread.start()
+        for thread in self.filethreads:
+            thread.wait()
 
     def Save(self,filename=None):
         idx=self.tabs.currentIndex()
         tableview=self.tabs.widget(idx)
-        selectedrows = [index.row() for index in tableview.selectionModel().selectedRows() if
-                   tableview.model().getItem(index.row()).offset >= 0]
+        model=self.TableModel(tableview)
+        selectedrows = [row for row in self.SelectedRows(tableview) if model.getItem(row).offset >= 0]
         # default values
         offset = 0; numbytes = None
         # check if selected rows outside table headers and set offset & numbytes accordingly
@@ -412,34 +778,111 @@ class TableManagerMain(QMainWindow):
             dlg.addButton("Complete table",QMessageBox.YesRole)
             all=dlg.exec()
             if not all:
-                offset=min([tableview.model().getItem(row).offset for row in selectedrows])
-                numbytes=sum([tableview.model().getItem(row).bytesSize() for row in range(min(selectedrows),max(selectedrows)+1)])
+                offset,numbytes=model.getSpan(min(selectedrows),max(selectedrows))
 
         if not filename:
-            filename=tableview.model().getCurrentFilename()
+            filename=model.getCurrentFilename()
             if not filename:
                 # define a new filename
                 filename = QFileDialog.getSaveFileName(self,caption= "Save TBL File as",filter="*.tbl")[0]
         if filename:
             if not filename.endswith('.tbl'):
                 filename+='.tbl'
+            if any(os.path.abspath(thread.filename)==os.path.abspath(filename) for thread in self.filethreads):
+                self.statusbar.showMessage("file {0} is already being opened or saved".format(filename))
+                return
             try:
-                tableview.model().encode(filename,offset,numbytes)
-                if numbytes:
-                    self.Open_file(filename)
-                    msg="table {0} partially saved in file {1}".format(self.tabs.tabText(idx),filename)
-                else:
-                    self.tabs.setTabText(idx,os.path.basename(filename))
-                    self.UpdateInfo(idx)
-                    msg="file {0} saved".format(filename)
-                self.statusbar.showMessage(msg)
-                self.logger.info(msg)
+                # the table is encoded now, the file is written by a thread
+                partial,blocks=model.encodeBlocks(filename,offset,numbytes)
+                self.UpdateInfo(idx)
+                self.statusbar.showMessage("Saving file {0}...".format(filename))
+                self.StartFileThread(TableSaveThread(model,tableview,filename,partial,blocks,self))
             except ValueError as err:
                 self.statusbar.showMessage(str(err))
                 self.logger.error(str(err))
         else:
             self.statusbar.showMessage("No file saved")
 
+    def SavePartialLoads(self,baseline=None,filename=None):
+        # smallest set of partial tables updating a baseline .tbl file to the current table
+        idx=self.tabs.currentIndex()
+        if idx==-1:
+            self.statusbar.showMessage("No table to save")
+            return
+        tableview=self.tabs.widget(idx)
+        model=self.TableModel(tableview)
+        if not baseline:
+            baseline = QFileDialog.getOpenFileName(self,caption="Baseline TBL File",filter="*.tbl")[0]
+        if baseline and not filename:
+            filename = QFileDialog.getSaveFileName(self,caption="Save partial loads as",filter="*.tbl")[0]
+        if not baseline or not filename:
+            self.statusbar.showMessage("No file saved")
+            return
+        try:
+            loads=model.partialLoads(baseline,filename)
+            for name,offset,numbytes in loads:
+                partial,blocks=model.encodeBlocks(name,offset,numbytes)
+                self.StartFileThread(TableSaveThread(model,tableview,name,partial,blocks,self,reopen=False))
+        except (struct.error,ValueError,OSError) as err:
+            self.statusbar.showMessage(str(err))
+            self.logger.error(str(err))
+            return
+        if loads:
+            self.UpdateInfo(idx)
+            msg="{0} partial loads ({1} bytes) of table {2} from baseline {3}: {4}".format(
+                len(loads),sum(HEADER_SIZE+numbytes for name,offset,numbytes in loads),self.tabs.tabText(idx),baseline,
+                ", ".join(os.path.basename(name) for name,offset,numbytes in loads))
+        else:
+            msg="table {0} doesn't differ from baseline {1}".format(self.tabs.tabText(idx),baseline)
+        self.statusbar.showMessage(msg)
+        self.logger.info(msg)
+
+    def ApplyPartialLoads(self,filenames=None):
+        # partial .tbl files applied in their order onto the current table
+        idx=self.tabs.currentIndex()
+        if idx==-1:
+            self.statusbar.showMessage("No table to load")
+            return
+        if not filenames:
+            filenames = QFileDialog.getOpenFileNames(self,caption="Partial loads",filter="*.tbl")[0]
+        if filenames:
+            crc,count,error=self.TableModel(self.tabs.widget(idx)).applyLoads(filenames)
+            self.UpdateInfo(idx)
+            if error:
+                self.logger.error(error)
+            if error and not count:
+                msg=error
+            else:
+                msg="{0} values of table {1} changed by the partial loads, CRC 0x{2:04x}".format(count,self.tabs.tabText(idx),crc)
+                if error:
+                    msg="{0} ({1})".format(msg,error)
+                self.logger.info(msg)
+            self.statusbar.showMessage(msg)
+
+    def FileSaved(self,thread):
+        filename=thread.filename
+        saved=not thread.cancelled and not thread.error
+        thread.model.encodeDone(filename,thread.partial,saved)
+        idx=self.tabs.indexOf(thread.tableview)
+        if thread.cancelled:
+            msg="Saving of file {0} cancelled".format(filename)
+            self.logger.warning(msg)
+        elif thread.error:
+            msg=thread.error
+            self.logger.error(msg)
+        elif thread.partial:
+            if thread.reopen:
+                self.Open_file(filename)
+            msg="table {0} partially saved in file {1}".format(self.tabs.tabText(idx),filename)
+            self.logger.info(msg)
+        else:
+            if idx!=-1:
+                self.tabs.setTabText(idx,os.path.basename(filename))
+                self.UpdateInfo(idx)
+            msg="file {0} saved".format(filename)
+            self.logger.info(msg)
+        self.statusbar.showMessage(msg)
+
 
     def Quit(self):
         # check all the tabs before closing window
@@ -447,6 +890,11 @@ class TableManagerMain(QMainWindow):
             self.CloseTab(idx)
         self.close()
 
+    def closeEvent(self,event):
+        self.StopLoadingTablesDefinition()
+        self.StopFileThreads()
+        super(TableManagerMain,self).closeEvent(event)
+
     def About(self):
         dlg = QMessageBox(self)
         dlg.setWindowTitle("About TableManager")
@@ -1,14 +1,24 @@
 import datetime
+import mmap
 from TableDefinition import *
-from TableCRC import crc16arc
+from TableCRC import crc16arc,crc16arcShift
+from TableDiff import diffImages,partialLoads,loadSpan,readImage
 import os
 JD2000 = datetime.datetime(2000, 1, 1, 11, 58, 56, 816000)
+# bytes read or written at once, progress is reported after each block
+BLOCK_SIZE=1024*1024
+
+class OperationCancelled(Exception):
+    """
+    raised by decode and write when the progress function returns False
+    """
 
 class TableObject(object):
     """
     TableObject contains
      - a TableTemplate having the template of the table but with default values
      - a values list, with the current values modified by the user
+       (decoded from the file on first access)
      - the current file name from decode or from encode
     """
     def __init__(self,tabledef=None):
@@ -17,9 +27,9 @@ class TableObject(object):
             self.loadTableDefinition(tabledef)
         else:
             self.tabledef = TableDefinition()
+            self.resetImage()
         self.isEdited =False
         self.currentfilename=None
-        self.crc=None
 
     def info(self):
         crc=self.calculateCRC()
@@ -32,8 +42,11 @@ class TableObject(object):
         return "\n".join(["{0}:\t{1}".format(k,v) for k,v in infos.items()])
 
     def loadTableDefinition(self, tabledef):
+        if isinstance(tabledef,LazyTableDefinition):
+            tabledef=tabledef.materialize()
         self.tabledef =tabledef
         self.values = self.tabledef.getdefaultvalues()
+        self.resetImage()
 
     def __len__(self):
         return len(self.values)
@@ -50,8 +63,8 @@ class TableObject(object):
         j = self.tabledef.findIndex("TimeSubSeconds")
         if i and j:
             dt = datetime.datetime.now() - JD2000
-            self.values[i] = dt.days * 86400 + dt.seconds
-            self.values[j] = dt.microseconds
+            self.setValue(i,dt.days * 86400 + dt.seconds)
+            self.setValue(j,dt.microseconds)
 
     def get(self ,row ,colname):
         item = self.tabledef.items[row]
@@ -65,64 +78,304 @@ class TableObject(object):
         item = self.tabledef.items[row]
         value = item.cast(valuestr)
         if value!=None:
-            self.values[row]=value
+            self.setValue(row,value)
             return True
         return False
 
+    def get_many(self,rows):
+        # current values of the rows
+        values=self.values
+        return [values[row] for row in rows]
+
+    def set_many(self,pairs):
+        """
+        set the values of (name,valuestr) pairs: all the values are found, cast
+        and checked against the item encoding before any change, then the valid
+        ones are set in order.
+        Returns the list of (row,previous value,value) set and the list of error messages
+        """
+        pairs=list(pairs)
+        rows=self.tabledef.findIndices([name for name,valuestr in pairs])
+        codec=self.tabledef.codec()
+        changes=[]
+        errors=[]
+        for (name,valuestr),row in zip(pairs,rows):
+            if row is None:
+                errors.append("{0} not found".format(name))
+                continue
+            try:
+                value=self.tabledef.items[row].cast(valuestr)
+                if value is not None:
+                    # out of range values are not encoded
+                    codec.encodeItem(row,value)
+            except (ValueError,TypeError,KeyError,SyntaxError,NameError,OverflowError,struct.error):
+                value=None
+            if value is None:
+                errors.append("{0} value error {1}".format(name,valuestr))
+            else:
+                changes.append((row,value))
+        result=[]
+        for row,value in changes:
+            result.append((row,self.values[row],value))
+            self.setValue(row,value)
+        if result:
+            self.isEdited=True
+        return result,errors
+
+    def setValue(self,row,value):
+        # set an already casted value (edit, undo, redo) and patch the binary image
+        self.values[row]=value
+        self.patchImage(row)
+
+    def resetImage(self):
+        # binary image and CRC have to be encoded again from the whole table
+        self.image=None
+        self.imagebigendian=None
+        self.crc=None
+
+    def getImage(self,bigendian=True):
+        # binary image of the table, encoded once then patched on each change
+        if self.image is None or self.imagebigendian!=bigendian:
+            self.resetImage()
+            self.image=self.tabledef.encode(self.values,bigendian)
+            if self.image is not None:
+                self.imagebigendian=bigendian
+        return self.image
+
+    def patchImage(self,row):
+        # write the item bytes in the image at its position and update the CRC:
+        # CRC-16 is linear, crc(table ^ delta) = crc(table) ^ crc(delta),
+        # with crc(delta) computed from the changed bytes shifted up to the end of the table
+        if self.image is None:
+            return
+        codec=self.tabledef.codec(self.imagebigendian)
+        try:
+            new=codec.encodeItem(row,self.values[row])
+        except (struct.error,ValueError,TypeError,OverflowError):
+            self.resetImage()
+            return
+        position=codec.positions[row]
+        view=memoryview(self.image)[position:position+len(new)]
+        if self.crc is not None and position>=HEADER_SIZE:
+            delta=bytes(a^b for a,b in zip(view,new))
+            self.crc^=crc16arcShift(crc16arc(delta),codec.size-position-len(new))
+        view[:]=new
+
+    def reloadValues(self,start,stop):
+        # values of the rows start to stop changed in the image
+        if isinstance(self.values,TableDefinitionValues) and self.values.buffer is self.image:
+            self.values.invalidate(start,stop)
+        else:
+            codec=self.tabledef.codec(self.imagebigendian)
+            for row in range(start,stop):
+                self.values[row]=codec.decodeItem(row,self.image)
+
+    def applyLoad(self,load,bigendian=True):
+        """
+        apply a partial table image (headers, then NumBytes of data) onto the
+        complete table in place, the CRC being updated from the changed bytes
+        and only the values of the rows loaded being decoded again.
+        Returns the (start,stop) rows loaded
+        """
+        if isinstance(self.tabledef,TableDefinitionRange):
+            raise ValueError("partial tables are only applied onto a complete table")
+        position,nbytes=loadSpan(self.tabledef,load,bigendian)
+        image=self.getImage(bigendian)
+        if image is None:
+            raise ValueError("Error during encoding {0}".format(self.tabledef.getTableName()))
+        with memoryview(image) as view, memoryview(load) as data:
+            old,new=view[position:position+nbytes],data[HEADER_SIZE:HEADER_SIZE+nbytes]
+            # the CRC of a large load is computed again from the whole table
+            if self.crc is not None and 2*nbytes<len(image):
+                delta=(int.from_bytes(old,"big")^int.from_bytes(new,"big")).to_bytes(nbytes,"big")
+                self.crc^=crc16arcShift(crc16arc(delta),len(image)-position-nbytes)
+            else:
+                self.crc=None
+            old[:]=new
+            old.release()
+            new.release()
+        start=self.tabledef.rowAt(position-HEADER_SIZE)
+        stop=self.tabledef.rowAt(position+nbytes-1-HEADER_SIZE)+1
+        self.reloadValues(start,stop)
+        self.isEdited=True
+        return start,stop
+
+    def applyLoads(self,filenames,bigendian=True):
+        """
+        apply the partial tables of the .tbl files onto the complete table in their
+        order, as Table Services on board. Returns the CRC of the resulting table.
+        The loads are checked one by one: the ones before an invalid load stay applied
+        """
+        for filename in filenames:
+            with readImage(filename) as load:
+                self.applyLoad(load,bigendian)
+        return self.calculateCRC(bigendian)
+
     def calculateCRC(self,bigendian=True):
         # compute CRC without table headers
-        buffer=self.tabledef.encode(self.values,bigendian)
-        if buffer:
-            return crc16arc(buffer[struct.calcsize(HEADER_ENCODING):])
-        else:
+        buffer=self.getImage(bigendian)
+        if buffer is None:
             return None
+        if self.crc is None:
+            self.crc=crc16arc(memoryview(buffer)[HEADER_SIZE:])
+        return self.crc
 
-
-    def encode(self,filename,offset=0,nbytes=None,bigendian=True):
+    def encode(self,filename,offset=0,nbytes=None,bigendian=True,settime=True,progress=None):
         # encode data according table definition and save in filename
-        self.setCurrentTime()
+        partial,blocks=self.encodeBlocks(filename,offset,nbytes,bigendian,settime)
+        self.write(filename,blocks,progress)
+        if not partial:
+            self.currentfilename = filename
+        return partial
+
+    def encodeBlocks(self,filename,offset=0,nbytes=None,bigendian=True,settime=True):
+        """
+        (partial,blocks) to be written in filename by write(), blocks being
+        copies of the binary image: the table may change while they are written
+        """
+        if settime:
+            self.setCurrentTime()
+        buffer=self.getImage(bigendian)
+        if buffer is None:
+            raise ValueError("Error during encoding {0}".format(os.path.basename(filename)))
+        view=memoryview(buffer)
         if offset==0 and nbytes==None:
-            buffer = self.tabledef.encode(self.values, bigendian)
-            new_tabledef = None
-        else:
-            new_tabledef,indexes=self.tabledef.reduceTo(offset,nbytes)
-            new_values=self.values.copy()
-            idx=new_tabledef.findIndex("NumBytes")
-            new_values[idx]=nbytes
-            idx=new_tabledef.findIndex("Offset")
-            new_values[idx]=offset
-            buffer=new_tabledef.encode([new_values[i] for i in indexes],bigendian)
-        if buffer:
-            with open(filename, 'wb') as fd:
-                fd.write(buffer)
-            if not new_tabledef:
-                self.currentfilename = filename
-                return False
-            else:
-                return True
-        else:
+            return False,[bytes(view)]
+        # partial table: headers with the new Offset/NumBytes, then the image slices of the items
+        new_tabledef,indexes=self.tabledef.reduceTo(offset,nbytes)
+        codec=self.tabledef.codec(bigendian)
+        header=bytearray(view[:HEADER_SIZE])
+        try:
+            for name,value in (("NumBytes",nbytes),("Offset",offset)):
+                idx=self.tabledef.findIndex(name)
+                data=codec.encodeItem(idx,value)
+                header[codec.positions[idx]:codec.positions[idx]+len(data)]=data
+        except (struct.error,ValueError,TypeError,OverflowError):
             raise ValueError("Error during encoding {0}".format(os.path.basename(filename)))
+        # the items of the partial table follow each other in the image
+        start,stop=self.tabledef.position(indexes.start),self.tabledef.position(indexes.stop)
+        return True,[bytes(header),bytes(view[start:stop])]
+
+    def write(self,filename,blocks,progress=None):
+        """
+        write the blocks in filename by BLOCK_SIZE, progress(done,total) being
+        called after each block. The blocks are written in a temporary file
+        replacing filename at the end: filename is unchanged on error or when
+        progress returns False (OperationCancelled)
+        """
+        total=sum(len(block) for block in blocks)
+        done=0
+        tmpname="{0}.{1}.tmp".format(filename,os.getpid())
+        try:
+            with open(tmpname,'wb') as fd:
+                for block in blocks:
+                    view=memoryview(block)
+                    for start in range(0,len(view),BLOCK_SIZE):
+                        done+=fd.write(view[start:start+BLOCK_SIZE])
+                        if progress and not progress(done,total):
+                            raise OperationCancelled("saving of {0} cancelled".format(os.path.basename(filename)))
+            os.replace(tmpname,filename)
+        except BaseException:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
 
     def decodeTableName(self ,filename,bigendian=True):
-        # decode TableName from filename in the Secondary Header
+        # decode TableName from filename in the Secondary Header, only the headers are read
         with open(filename,'rb') as fd:
-            buffer=fd.read()
+            buffer=fd.read(HEADER_SIZE)
         self.currentfilename=filename
         return self.tabledef.decodeTableName(buffer,bigendian)
 
-    def decode(self ,filename,bigendian=True):
+    def decode(self ,filename,bigendian=True,progress=None):
         # decode entire table from filename based on offset/Numbytes
         # and the related Table Definition
+        # the file is memory mapped: only the headers and the Offset/NumBytes
+        # range are read, and copied once into the binary image by BLOCK_SIZE,
+        # progress(done,total) being called after each block (OperationCancelled
+        # if it returns False, the table being unchanged)
         with open(filename,'rb') as fd:
-            buffer=fd.read()
+            try:
+                mapped=mmap.mmap(fd.fileno(),0,access=mmap.ACCESS_READ)
+            except ValueError:
+                raise struct.error("empty file {0}".format(os.path.basename(filename)))
+        with mapped, memoryview(mapped) as buffer:
+            header=self.tabledef.decodeHeader(buffer,bigendian)
+            if header is None:
+                raise struct.error("file {0} shorter than the table headers".format(os.path.basename(filename)))
+            offset,nbytes=header[HEADER_OFFSET],header[HEADER_NUMBYTES]
+            new_tabledef,indexes=self.tabledef.reduceTo(offset,nbytes)
+            size=new_tabledef.codec(bigendian).size
+            # the file content is the binary image of the decoded table
+            size=min(size,len(buffer))
+            image=bytearray(size)
+            for start in range(0,size,BLOCK_SIZE):
+                stop=min(start+BLOCK_SIZE,size)
+                image[start:stop]=buffer[start:stop]
+                if progress and not progress(stop,size):
+                    raise OperationCancelled("opening of {0} cancelled".format(os.path.basename(filename)))
+        # values are decoded from the image when displayed or saved
+        self.values=new_tabledef.decode(image,bigendian,lazy=True)
         self.currentfilename=filename
-        offset,nbytes=self.tabledef.decodeOffsetAndNumBytes(buffer,bigendian)
-        new_tabledef,indexes=self.tabledef.reduceTo(offset,nbytes)
-        self.values=new_tabledef.decode(buffer,bigendian)
         self.tabledef=new_tabledef
+        self.resetImage()
+        self.image=image
+        self.imagebigendian=bigendian
+
+    def diff(self,filename,bigendian=True):
+        """
+        (row,value,file value) of the items differing between the table and
+        the .tbl file filename of the same table, rows of this table.
+        Only the items loaded by both are compared
+        """
+        buffer=self.getImage(bigendian)
+        if buffer is None:
+            raise ValueError("Error during encoding {0}".format(self.tabledef.getTableName()))
+        with readImage(filename) as other:
+            tblname=self.tabledef.decodeTableName(other,bigendian)
+            if tblname is None:
+                raise struct.error("file {0} is not TBL file".format(filename))
+            if tblname!=self.tabledef.getTableName():
+                raise ValueError("TableName {0} of {1} differs from {2}".format(tblname,filename,self.tabledef.getTableName()))
+            differences=diffImages(self.tabledef,buffer,other,bigendian)
+        # rows of the complete table definition to rows of a partial table
+        complete=self.tabledef.parent if isinstance(self.tabledef,TableDefinitionRange) else self.tabledef
+        return [(self.tabledef.rowAt(complete.position(row)-HEADER_SIZE),value,othervalue)
+                for row,value,othervalue in differences]
+
+    def partialLoads(self,baseline,bigendian=True):
+        # (offset,nbytes) of the smallest set of partial tables updating the .tbl file baseline to the table
+        buffer=self.getImage(bigendian)
+        if buffer is None:
+            raise ValueError("Error during encoding {0}".format(self.tabledef.getTableName()))
+        with readImage(baseline) as other:
+            if self.tabledef.decodeTableName(other,bigendian)!=self.tabledef.getTableName():
+                raise ValueError("file {0} is not a {1} table".format(baseline,self.tabledef.getTableName()))
+            return partialLoads(self.tabledef,other,buffer,bigendian)
+
+    def partialLoadNames(self,filename,count):
+        # names of count partial tables saved as filename: <name>_<n>.tbl
+        root,ext=os.path.splitext(filename)
+        return ["{0}_{1}{2}".format(root,i+1,ext or ".tbl") for i in range(count)]
+
+    def encodePartialLoads(self,baseline,filename,bigendian=True,settime=True):
+        """
+        save the smallest set of partial tables updating the .tbl file baseline
+        to the table, as filename_1.tbl, filename_2.tbl, ...
+        Returns the list of (file name,offset,nbytes)
+        """
+        loads=self.partialLoads(baseline,bigendian)
+        names=self.partialLoadNames(filename,len(loads))
+        for name,(offset,nbytes) in zip(names,loads):
+            self.encode(name,offset,nbytes,bigendian,settime)
+        return [(name,offset,nbytes) for name,(offset,nbytes) in zip(names,loads)]
 
-    def copyText(self):
-        return str(self)
+    def copyText(self,rows=None):
+        # "name<tab>value" lines of the rows, of the whole table by default
+        if rows is None:
+            return str(self)
+        items=self.tabledef.items
+        return "\n".join(["{0}\t{1}".format(items[row].name,value) for row,value in zip(rows,self.get_many(rows))])
 
     def __repr__(self):
         return "\n".join(["{0}\t{1}".format(item.name,v) for item,v in zip(self.tabledef.items,self.values)])
@@ -1,6 +1,10 @@
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import QValidator,QBrush
+from TableHistory import TableHistory
+from TableDiff import diffImages
+import struct
+import bisect
 
 class CustomIntValidator(QValidator):
     def __init__(self,mini,maxi):
@@ -32,6 +36,8 @@ class CustomDelegate(QStyledItemDelegate):
         super().__init__(parent)
 
     def createEditor(self, parent, option, index):
+        # index of the view model (TableFilterModel), item of the table model row
+        index=index.model().mapToSource(index)
         datatype=index.model().getDataType(index.row())
         if "enum" in datatype:
             editor= QComboBox(parent)
@@ -66,12 +72,31 @@ class CustomDelegate(QStyledItemDelegate):
             editor_value=None
         model.setData(index, editor_value, Qt.EditRole)
 
+class TableView(QTableView):
+    """
+    TableView is the view of a TableFilterModel: the rows not fetched yet are
+    fetched before selecting all, the rows selected (copied, saved) being the
+    complete table
+    """
+    def selectAll(self):
+        self.model().sourceModel().fetchAll()
+        super().selectAll()
+
+# rows added to the model at once, when the view scrolls to the last ones
+FETCH_ROWS=1000
+
 class CustomTableModel(QAbstractTableModel):
-    def __init__(self,table,parent=None):
+    def __init__(self,table,parent=None,history=None):
         QAbstractTableModel.__init__(self, parent)
         self._table=table
         self.columns=["Name","Description","Datatype","Value"]
-        self.stack = QUndoStack()
+        # history settings: memory
+        self.history = TableHistory(table,**(history or {}))
+        # displayed value and editable flag of the rows, computed on first display
+        self.displays = {}
+        self.editable = {}
+        self.background = QBrush(Qt.lightGray)
+        self.fetched = min(len(table),FETCH_ROWS)
 
     def flags(self, index):
         if index.column() < len(self.columns)-1 or not self.isEditable(index.row()):
@@ -80,7 +105,26 @@ class CustomTableModel(QAbstractTableModel):
             return Qt.ItemIsEnabled | Qt.ItemIsSelectable| Qt.ItemIsEditable
 
     def rowCount(self, parent=None):
-        return len(self._table)
+        return self.fetched
+
+    def canFetchMore(self, parent=None):
+        if parent is not None and parent.isValid():
+            return False
+        return self.fetched < len(self._table)
+
+    def fetchMore(self, parent=None):
+        self.fetchTo(self.fetched+FETCH_ROWS)
+
+    def fetchAll(self):
+        self.fetchTo(len(self._table))
+
+    def fetchTo(self, count):
+        # rows fetched up to count
+        count=min(count,len(self._table))
+        if count>self.fetched:
+            self.beginInsertRows(QModelIndex(),self.fetched,count-1)
+            self.fetched=count
+            self.endInsertRows()
 
     def columnCount(self, parent=None):
         return len(self.columns)
@@ -89,9 +133,17 @@ class CustomTableModel(QAbstractTableModel):
         if not index.isValid():
             return None
         if role in [Qt.DisplayRole,Qt.EditRole]:
+            if index.column()==len(self.columns)-1:
+                return self.display(index.row())
             return self._table.get(index.row(),self.columns[index.column()].lower())
         if role==Qt.BackgroundRole and  not self.isEditable(index.row()):
-            return QBrush(Qt.lightGray)
+            return self.background
+
+    def display(self,row):
+        display=self.displays.get(row)
+        if display is None:
+            display=self.displays[row]=self._table.get(row,"value")
+        return display
 
     def headerData(self, section, orientation, role):
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
@@ -103,9 +155,11 @@ class CustomTableModel(QAbstractTableModel):
         if not index.isValid():
             return False
         if role == Qt.EditRole:
-            prev=self._table.values[index.row()]
-            if self._table.set(index.row(),value):
-                self.stack.push(CellEdit(index, prev, self))
+            row=index.row()
+            prev=self._table.values[row]
+            if self._table.set(row,value):
+                self.history.record([(row,prev,self._table.values[row])])
+                self.displays.pop(row,None)
                 self.dataChanged.emit(index, index)
                 return True
         return False
@@ -118,7 +172,10 @@ class CustomTableModel(QAbstractTableModel):
         return self._table.get(row,"datarange")
 
     def isEditable(self,row):
-        return self._table.get(row,"editable")>0
+        editable=self.editable.get(row)
+        if editable is None:
+            editable=self.editable[row]=self._table.get(row,"editable")>0
+        return editable
 
     def isModified(self):
         return self._table.isEdited
@@ -129,36 +186,221 @@ class CustomTableModel(QAbstractTableModel):
     def findIndex(self,name):
         return self._table.tabledef.findIndex(name)
 
-    def copyText(self):
-        return self._table.copyText()
+    def search(self,text,within=None):
+        return self._table.tabledef.search(text,within)
+
+    def copyText(self,rows=None):
+        return self._table.copyText(rows)
+
+    def diff(self,filename):
+        # (name,value,file value) of the items differing from filename
+        items=self._table.tabledef.items
+        return [(items[row].name,value,othervalue) for row,value,othervalue in self._table.diff(filename)]
 
     def getCurrentFilename(self):
         return self._table.currentfilename
 
-    def getValue(self,idx):
-        return self._table.values[idx]
+    def setValues(self,pairs):
+        # set the values of (name,valuestr) pairs as one undo command, list of errors
+        changes,errors=self._table.set_many(pairs)
+        if changes:
+            self.history.record(changes)
+            self.rowsChanged([row for row,prev,value in changes])
+        return len(changes),errors
+
+    def undo(self):
+        rows=self.history.undo()
+        if rows:
+            self.rowsChanged(rows)
+
+    def redo(self):
+        rows=self.history.redo()
+        if rows:
+            self.rowsChanged(rows)
+
+    def rowsChanged(self,rows=None):
+        # one dataChanged for the rows changed (all the rows if None) already fetched
+        if rows:
+            for row in rows:
+                self.displays.pop(row,None)
+            first,last=min(rows),min(max(rows),self.fetched-1)
+        else:
+            self.displays.clear()
+            first,last=0,self.fetched-1
+        if first<=last:
+            self.dataChanged.emit(self.index(first,0),self.index(last,self.columnCount()-1),[Qt.DisplayRole])
 
     def getItem(self,index_or_name):
         if type(index_or_name)==type(str()):
             index_or_name=self.findIndex(index_or_name)
         return self._table.tabledef.items[index_or_name]
 
-    def encode(self,filename,offset,numbytes):
-        self._table.encode(filename,offset,numbytes)
+    def getSpan(self,first,last):
+        # (offset,nbytes) of the rows first to last
+        return self._table.tabledef.span(first,last+1)
+
+    def encodeBlocks(self,filename,offset,numbytes):
+        # (partial,blocks) to be written by a thread, the table being saved
+        # as it is now: it can be edited again while the blocks are written
+        partial,blocks=self._table.encodeBlocks(filename,offset,numbytes)
         self._table.isEdited = False
+        self.rowsChanged()
+        return partial,blocks
 
-class CellEdit(QUndoCommand):
-    def __init__(self, index, prev, model, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.index = index
-        self.value = model._table.values[index.row()]
-        self.prev = prev
-        self.model = model
+    def partialLoads(self,baseline,filename):
+        # (file name,offset,nbytes) of the smallest set of partial tables updating baseline to the table
+        loads=self._table.partialLoads(baseline)
+        names=self._table.partialLoadNames(filename,len(loads))
+        return [(name,offset,nbytes) for name,(offset,nbytes) in zip(names,loads)]
 
-    def undo(self):
-        self.model._table.values[self.index.row()] = self.prev
-        self.model.dataChanged.emit(self.index,self.index,[Qt.DisplayRole])
+    def applyLoads(self,filenames):
+        """
+        apply partial .tbl files onto the table as one undo command:
+        (CRC of the table,count of values changed,error message)
+        """
+        previous=bytes(self._table.getImage())
+        error=None
+        try:
+            crc=self._table.applyLoads(filenames)
+        except (struct.error,ValueError,OSError) as err:
+            crc,error=self._table.calculateCRC(),str(err)
+        # values changed, found by comparing the images
+        changes=diffImages(self._table.tabledef,previous,self._table.getImage())
+        if changes:
+            self.history.record([(row,value,self._table.values[row]) for row,value,newvalue in changes])
+            self.rowsChanged([row for row,value,newvalue in changes])
+        return crc,len(changes),error
 
-    def redo(self):
-        self.model._table.values[self.index.row()] = self.value
-        self.model.dataChanged.emit(self.index,self.index,[Qt.DisplayRole])
+    def write(self,filename,blocks,progress=None):
+        # executed by a thread: only the blocks are used, not the table
+        self._table.write(filename,blocks,progress)
+
+    def encodeDone(self,filename,partial,saved):
+        if not saved:
+            self._table.isEdited = True
+        elif not partial:
+            self._table.currentfilename = filename
+
+
+class TableDiffModel(QAbstractTableModel):
+    """
+    TableDiffModel shows the (name,value,other value) items differing between two tables
+    """
+    def __init__(self,differences,columns,parent=None):
+        QAbstractTableModel.__init__(self, parent)
+        self.differences=differences
+        self.columns=["Name"]+columns
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.differences)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.columns)
+
+    def data(self, index, role=None):
+        if index.isValid() and role==Qt.DisplayRole:
+            return str(self.differences[index.row()][index.column()])
+
+    def headerData(self, section, orientation, role):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.columns[section]
+        if orientation == Qt.Vertical and role == Qt.DisplayRole:
+            return f"{section + 1}"
+
+
+class TableFilterModel(QAbstractProxyModel):
+    """
+    TableFilterModel shows the rows of a CustomTableModel whose name or
+    description contains the filter text, found by the search index of the
+    table definition: its cost depends on the number of rows found.
+    The rows found are sorted, mapped back to the table rows by bisect.
+    """
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.text = ""
+        # table rows shown, None for all the rows
+        self.rows = None
+        self.setSourceModel(model)
+        model.dataChanged.connect(self.sourceDataChanged)
+        model.rowsAboutToBeInserted.connect(self.sourceRowsAboutToBeInserted)
+        model.rowsInserted.connect(self.sourceRowsInserted)
+
+    def setFilter(self, text):
+        if text.lower()==self.text.lower():
+            self.text=text
+            return
+        model=self.sourceModel()
+        rows=None
+        if text:
+            # a longer text is only searched in the rows found for the previous one
+            within=self.rows if self.rows is not None and self.text.lower() in text.lower() else None
+            rows=model.search(text,within)
+            if rows:
+                model.fetchTo(rows[-1]+1)
+        self.beginResetModel()
+        self.rows=rows
+        self.text=text
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return len(self.rows) if self.rows is not None else self.sourceModel().rowCount()
+
+    def columnCount(self, parent=QModelIndex()):
+        if self.sourceModel() is None:
+            return 0
+        return self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0<=row<self.rowCount() and 0<=column<self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QModelIndex()
+
+    def mapToSource(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        row=self.rows[index.row()] if self.rows is not None else index.row()
+        return self.sourceModel().index(row, index.column())
+
+    def mapFromSource(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        row=index.row()
+        if self.rows is not None:
+            row=bisect.bisect_left(self.rows,index.row())
+            if row==len(self.rows) or self.rows[row]!=index.row():
+                return QModelIndex()
+        return self.index(row, index.column())
+
+    def sourceRows(self, indexes):
+        # sorted table rows of proxy indexes
+        return sorted(set(self.mapToSource(index).row() for index in indexes))
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return self.rows is None and self.sourceModel().canFetchMore(parent)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.rows is None:
+            self.sourceModel().fetchMore(parent)
+
+    def sourceDataChanged(self, first, last, roles=[]):
+        if self.rows is None:
+            self.dataChanged.emit(self.index(first.row(),first.column()),self.index(last.row(),last.column()),roles)
+            return
+        start=bisect.bisect_left(self.rows,first.row())
+        stop=bisect.bisect_right(self.rows,last.row())
+        if start<stop:
+            self.dataChanged.emit(self.index(start,first.column()),self.index(stop-1,last.column()),roles)
+
+    def sourceRowsAboutToBeInserted(self, parent, first, last):
+        # fetched rows, only shown without filter
+        if self.rows is None:
+            self.beginInsertRows(QModelIndex(),first,last)
+
+    def sourceRowsInserted(self, parent, first, last):
+        if self.rows is None:
+            self.endInsertRows()
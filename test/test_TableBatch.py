@@ -0,0 +1,162 @@
+import io
+import os
+import sys
+import json
+import types
+import shutil
+import tempfile
+import unittest
+import contextlib
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import TableBatch
+from TableObject import TableObject
+from TableDefinition import TableDefinition
+from test_TableDefinition import writeDefinition,MIXED
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname=tempfile.mkdtemp()
+        self.definitions=os.path.join(self.dirname,"definitions")
+        self.output=os.path.join(self.dirname,"output")
+        os.mkdir(self.definitions)
+        # the definitions cache of the batch processes is kept in the test directory
+        self.environ=dict(os.environ)
+        os.environ["XDG_CACHE_HOME"]=os.environ["LOCALAPPDATA"]=os.path.join(self.dirname,"cache")
+        self.tabledef=TableDefinition(writeDefinition(self.definitions,MIXED,"T.Batch"))
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.dirname)
+
+    def main(self,*args):
+        # (exit code,stdout,stderr) of the batch command line
+        out,err=io.StringIO(),io.StringIO()
+        with contextlib.redirect_stdout(out),contextlib.redirect_stderr(err):
+            code=TableBatch.main(list(args))
+        return code,out.getvalue(),err.getvalue()
+
+    def table(self,name,**values):
+        # .tbl file of the table with values
+        table=TableObject(self.tabledef)
+        changes,errors=table.set_many((key,str(value)) for key,value in values.items())
+        filename=os.path.join(self.dirname,name)
+        table.encode(filename)
+        return filename
+
+    def read(self,filename):
+        with open(filename,'rb') as fd:
+            return fd.read()
+
+
+class TestTableBatch(BatchTestCase):
+    def test_round_trip(self):
+        original=self.table("a.tbl",u8=17,u32=123456,f=2.5,s="hey",e="OFF [0]")
+        for fmt in ("json","csv"):
+            output=os.path.join(self.output,fmt)
+            code,out,err=self.main("decode",self.definitions,original,"-o",output,"-f",fmt,"-j","1")
+            self.assertEqual((code,err),(0,""))
+            values=os.path.join(output,"a."+fmt)
+            self.assertEqual(dict(TableBatch.readValues(values))["u8"],"17" if fmt=="csv" else 17)
+            code,out,err=self.main("encode",self.definitions,values,"-o",output,"--keep-time","-j","1")
+            self.assertEqual((code,err),(0,""))
+            self.assertEqual(self.read(os.path.join(output,"a.tbl")),self.read(original))
+
+    def test_workers(self):
+        files=[self.table("t{0}.tbl".format(i),u16=i) for i in range(4)]
+        for workers in ("1","3"):
+            output=os.path.join(self.output,workers)
+            code,out,err=self.main("decode",self.definitions,self.dirname,"-o",output,"-j",workers)
+            self.assertEqual(code,0)
+            self.assertIn("4 files processed, 0 errors",out)
+        for file in files:
+            name=os.path.splitext(os.path.basename(file))[0]+".json"
+            self.assertEqual(self.read(os.path.join(self.output,"1",name)),self.read(os.path.join(self.output,"3",name)))
+
+    def test_partial(self):
+        # Offset/NumBytes of the values file give a partial table
+        original=self.table("a.tbl",u16=99)
+        self.main("decode",self.definitions,original,"-o",self.output,"-j","1")
+        values=os.path.join(self.output,"a.json")
+        with open(values,'r') as fd:
+            data=json.load(fd)
+        offset,nbytes=self.tabledef.span(15,16)
+        data.update(Offset=offset,NumBytes=nbytes)
+        with open(values,'w') as fd:
+            json.dump(data,fd)
+        code,out,err=self.main("encode",self.definitions,values,"-o",self.output,"-j","1")
+        self.assertEqual(code,0)
+        partial=self.read(os.path.join(self.output,"a.tbl"))
+        self.assertEqual(len(partial),TableBatch.HEADER_SIZE+2)
+        self.assertEqual(partial[-2:],b"\x00\x63")
+
+    def test_errors(self):
+        values=os.path.join(self.dirname,"bad.json")
+        for content,error in (({"TableName":"T.None"},"No table definition"),
+                              ({"TableName":"T.Batch","nope":1},"nope not found"),
+                              ({"TableName":"T.Batch","u8":"x"},"ValueError")):
+            with open(values,'w') as fd:
+                json.dump(content,fd)
+            code,out,err=self.main("encode",self.definitions,values,"-o",self.output,"-j","1")
+            self.assertEqual(code,1)
+            self.assertIn(error,err)
+            self.assertIn("1 files processed, 1 errors",out)
+        with open(os.path.join(self.dirname,"bad.tbl"),'wb') as fd:
+            fd.write(b"short")
+        code,out,err=self.main("decode",self.definitions,os.path.join(self.dirname,"bad.tbl"),"-o",self.output,"-j","1")
+        self.assertEqual(code,1)
+
+    def test_diff(self):
+        for dirname in ("one","two"):
+            os.mkdir(os.path.join(self.dirname,dirname))
+        self.table(os.path.join("one","a.tbl"),u8=1,s="x")
+        self.table(os.path.join("two","a.tbl"),u8=2,s="x")
+        self.table(os.path.join("one","b.tbl"))
+        self.table(os.path.join("two","b.tbl"))
+        code,out,err=self.main("diff",self.definitions,os.path.join(self.dirname,"one","a.tbl"),os.path.join(self.dirname,"two","a.tbl"))
+        self.assertEqual((code,err),(0,""))
+        self.assertIn("  u8\t1\t2\n",out)
+        self.assertNotIn("  s\t",out)
+        # directories: the files of the first one are compared to the same names
+        code,out,err=self.main("diff",self.definitions,os.path.join(self.dirname,"one"),os.path.join(self.dirname,"two"),"-j","2")
+        self.assertEqual(code,0)
+        self.assertIn("2 files compared, 0 errors",out)
+        os.remove(os.path.join(self.dirname,"two","b.tbl"))
+        code,out,err=self.main("diff",self.definitions,os.path.join(self.dirname,"one"),os.path.join(self.dirname,"two"),"-j","1")
+        self.assertEqual(code,1)
+        self.assertIn("b.tbl",err)
+        self.assertIn("2 files compared, 1 errors",out)
+
+    def test_apply(self):
+        baseline=self.table("baseline.tbl")
+        table=TableObject(self.tabledef)
+        table.set_many([("u8","9"),("d","0.5")])
+        loads=[name for name,offset,nbytes in table.encodePartialLoads(baseline,os.path.join(self.dirname,"load.tbl"))]
+        code,out,err=self.main("apply",self.definitions,baseline,*loads,"-o",self.output)
+        self.assertEqual((code,err),(0,""))
+        self.assertIn("(CRC 0x{0:04x})".format(table.calculateCRC()),out)
+        output=self.read(os.path.join(self.output,"baseline.tbl"))
+        self.assertEqual(output[TableBatch.HEADER_SIZE:],table.getImage()[TableBatch.HEADER_SIZE:])
+        # a load of another table
+        other=TableDefinition(writeDefinition(self.definitions,MIXED,"T.Other","other.json"))
+        TableObject(other).encode(os.path.join(self.dirname,"other.tbl"),*other.span(13,14))
+        code,out,err=self.main("apply",self.definitions,baseline,os.path.join(self.dirname,"other.tbl"),"-o",self.output)
+        self.assertEqual(code,1)
+        self.assertIn("is not a T.Batch table",err)
+
+    def test_write_values_error(self):
+        # the values file is unchanged when the values can't be written
+        filename=os.path.join(self.dirname,"values.json")
+        with open(filename,'w') as fd:
+            fd.write("previous")
+        table=types.SimpleNamespace(tabledef=types.SimpleNamespace(items=[types.SimpleNamespace(name="x")]),values=[object()])
+        with self.assertRaises(TypeError):
+            TableBatch.writeValues(table,filename)
+        with open(filename,'r') as fd:
+            self.assertEqual(fd.read(),"previous")
+        self.assertEqual(sorted(os.listdir(self.dirname)),["definitions","values.json"])
+
+
+if __name__=="__main__":
+    unittest.main()
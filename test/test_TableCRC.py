@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import TableCRC
+from TableCRC import *
+from TableDefinition import TableDefinition,HEADER_SIZE
+from TableObject import TableObject
+
+TESTDIR=os.path.dirname(os.path.abspath(__file__))
+
+
+def crc16arcReference(buffer):
+    # original table driven computation, byte per byte
+    crc=0x0000
+    for b in buffer:
+        crc=(crc >> 8) ^ CRC16ARC_TABLE[(crc ^ b) & 0xFF]
+    return crc
+
+
+def writeDefinition(dirname,count):
+    # HK copy table definition followed by an array of count uint8
+    with open(os.path.join(TESTDIR,"HK_copy_TBL.json"),'r') as fd:
+        items=json.load(fd)
+    items.append({"name":"Array","datatype":"uint8","count":count,"defaultvalue":0})
+    filename=os.path.join(dirname,"array.json")
+    with open(filename,'w') as fd:
+        json.dump(items,fd)
+    return filename
+
+
+class TestCrc16Arc(unittest.TestCase):
+    def test_check_value(self):
+        self.assertEqual(crc16arc(b"123456789"),0xBB3D)
+
+    def test_reference(self):
+        rand=random.Random(4)
+        threshold=TableCRC.NUMPY_THRESHOLD
+        for size in (0,1,7,8,9,255,4097,threshold-1,threshold,threshold+1,4*threshold+13):
+            buffer=bytes(rand.getrandbits(8) for i in range(size))
+            self.assertEqual(crc16arc(buffer),crc16arcReference(buffer),size)
+            self.assertEqual(crc16arc(bytearray(buffer)),crc16arcReference(buffer),size)
+
+    def test_without_numpy(self):
+        rand=random.Random(5)
+        buffer=bytes(rand.getrandbits(8) for i in range(TableCRC.NUMPY_THRESHOLD+5))
+        np,TableCRC.np=TableCRC.np,None
+        try:
+            self.assertEqual(crc16arc(buffer),crc16arcReference(buffer))
+        finally:
+            TableCRC.np=np
+
+    def test_chunks(self):
+        rand=random.Random(6)
+        buffer=bytes(rand.getrandbits(8) for i in range(3*TableCRC.NUMPY_THRESHOLD))
+        for cut in (0,1,1000,TableCRC.NUMPY_THRESHOLD+3,len(buffer)):
+            crc=Crc16Arc(buffer[:cut]).update(memoryview(buffer)[cut:])
+            self.assertEqual(crc.digest(),crc16arcReference(buffer))
+            self.assertEqual(crc.length,len(buffer))
+            combined=crc16arcCombine(crc16arc(buffer[:cut]),crc16arc(buffer[cut:]),len(buffer)-cut)
+            self.assertEqual(combined,crc16arcReference(buffer))
+
+    def test_shift(self):
+        # shifting is feeding zero bytes
+        for crc,nbytes in ((0x1234,0),(0x1234,1),(0xFFFF,77),(0x8005,TableCRC.NUMPY_THRESHOLD+1)):
+            self.assertEqual(crc16arcShift(crc,nbytes),crc16arcUpdate(crc,bytes(nbytes)))
+
+
+class TestTableCRC(unittest.TestCase):
+    """
+    CRC of a table updated from the changed bytes on each edit
+    compared to the CRC of the whole table
+    """
+    def setUp(self):
+        self.dirname=tempfile.mkdtemp()
+        tabledef=TableDefinition(writeDefinition(self.dirname,2*TableCRC.NUMPY_THRESHOLD))
+        self.table=TableObject(tabledef)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def fullCRC(self):
+        return crc16arcReference(self.table.getImage()[HEADER_SIZE:])
+
+    def test_edits(self):
+        rand=random.Random(7)
+        table=self.table
+        self.assertEqual(table.calculateCRC(),self.fullCRC())
+        names=[item.name for item in table.tabledef.items if item.name.startswith("Array#")]
+        for i in range(50):
+            pairs=[(rand.choice(names),str(rand.getrandbits(8))) for j in range(rand.randint(1,5))]
+            changes,errors=table.set_many(pairs)
+            self.assertEqual(errors,[])
+            self.assertIsNotNone(table.crc)
+            self.assertEqual(table.calculateCRC(),self.fullCRC())
+
+    def test_headers_edit(self):
+        # headers are not part of the CRC
+        crc=self.table.calculateCRC()
+        self.table.set_many([("SpacecraftID","42")])
+        self.assertEqual(self.table.calculateCRC(),crc)
+        self.assertEqual(crc,self.fullCRC())
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import struct
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from TableDefinition import *
+
+TESTDIR=os.path.dirname(os.path.abspath(__file__))
+
+
+def writeDefinition(dirname,items,tablename="T.Test",filename="test.json"):
+    # definition file of the table headers (from the HK copy table) followed by items
+    with open(os.path.join(TESTDIR,"HK_copy_TBL.json"),'r') as fd:
+        headers=json.load(fd)[:13]
+    headers[12]["defaultvalue"]=tablename
+    filename=os.path.join(dirname,filename)
+    with open(filename,'w') as fd:
+        json.dump(headers+items,fd)
+    return filename
+
+
+MIXED=[{"name":"u8","datatype":"uint8","defaultvalue":200},
+       {"name":"i8","datatype":"int8","defaultvalue":-5},
+       {"name":"u16","datatype":"uint16","defaultvalue":"0x1234"},
+       {"name":"pad","datatype":"uint24","defaultvalue":0},
+       {"name":"u32","datatype":"uint32","defaultvalue":70000},
+       {"name":"u64","datatype":"uint64","defaultvalue":2**40},
+       {"name":"f","datatype":"float","defaultvalue":1.5},
+       {"name":"d","datatype":"double","defaultvalue":-2.25},
+       {"name":"s","datatype":"string","length":8,"defaultvalue":"abc"},
+       {"name":"e","datatype":"enum16","datarange":{"OFF":0,"ON":1},"defaultvalue":"ON [1]"}]
+
+
+class DefinitionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname=tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def definition(self,items,tablename="T.Test"):
+        return TableDefinition(writeDefinition(self.dirname,items,tablename))
+
+
+class TestTableDefinitionCodec(DefinitionTestCase):
+    def reference(self,tabledef,values,convention):
+        # item per item encoding, as before the compiled codecs
+        data=bytearray()
+        for item,value in zip(tabledef.items,values):
+            value=item.encode(value)
+            data+=struct.pack(convention+item.encoding,*(value if type(value)==type(tuple()) else (value,)))
+        return data
+
+    def test_encode_decode(self):
+        tabledef=self.definition(MIXED)
+        values=tabledef.getdefaultvalues()
+        self.assertEqual(values[-10:],[200,-5,0x1234,0,70000,2**40,1.5,-2.25,"abc",1])
+        for bigendian,convention in ((True,">"),(False,"<")):
+            codec=TableDefinitionCodec(tabledef.items,bigendian)
+            image=codec.encode(values)
+            self.assertEqual(image,self.reference(tabledef,values,convention))
+            self.assertEqual(len(image),tabledef.bytesSize())
+            self.assertEqual(codec.decode(image),values)
+            for row,value in enumerate(values):
+                start,stop=tabledef.position(row),tabledef.position(row+1)
+                self.assertEqual(codec.encodeItem(row,value),image[start:stop])
+                self.assertEqual(codec.decodeItem(row,image),value)
+
+    def test_cached(self):
+        tabledef=self.definition(MIXED)
+        codec=tabledef.codec(True)
+        self.assertIs(tabledef.codec(True),codec)
+        self.assertIsNot(tabledef.codec(False),codec)
+        tabledef.setOffset()
+        self.assertIsNot(tabledef.codec(True),codec)
+
+    def test_encode_error(self):
+        tabledef=self.definition(MIXED)
+        values=tabledef.getdefaultvalues()
+        values[-10]=256
+        self.assertIsNone(tabledef.encode(values))
+
+    def test_short_buffer(self):
+        tabledef=self.definition(MIXED)
+        image=tabledef.encode(tabledef.getdefaultvalues())
+        with self.assertRaises(struct.error):
+            tabledef.decode(image[:-1])
+
+    def test_compact_encoding(self):
+        self.assertEqual(compactEncoding([("I",1),("I",2),("B",1),("4s",1),("4s",1),("BH",2)]),"3IB4s4sBHBH")
+        self.assertEqual(compactEncoding([("H",1000),("H",1),("4s",2),("H",3)]),"1001H4s4s3H")
+        self.assertEqual(compactEncoding([]),"")
+
+
+@unittest.skipIf(np is None,"numpy not available")
+class TestTableDefinitionNumpyCodec(DefinitionTestCase):
+    def runs(self):
+        # long runs of items of the same type, then a string and a pad
+        items=[{"name":"a{0}".format(i),"datatype":"uint16","defaultvalue":i} for i in range(600)]
+        items+=[{"name":"b{0}".format(i),"datatype":"float","defaultvalue":i/4} for i in range(400)]
+        items+=[{"name":"s","datatype":"string","length":5,"defaultvalue":"xyz"},
+                {"name":"pad","datatype":"uint24","defaultvalue":0},
+                {"name":"c","datatype":"int8","defaultvalue":-3}]
+        return self.definition(items)
+
+    def test_selection(self):
+        self.assertIsInstance(self.runs().codec(),TableDefinitionNumpyCodec)
+        self.assertNotIsInstance(self.definition(MIXED).codec(),TableDefinitionNumpyCodec)
+
+    def test_same_as_struct(self):
+        tabledef=self.runs()
+        values=tabledef.getdefaultvalues()
+        for bigendian in (True,False):
+            codec=tabledef.codec(bigendian)
+            reference=TableDefinitionCodec(tabledef.items,bigendian)
+            image=codec.encode(values)
+            self.assertEqual(image,reference.encode(values))
+            decoded=codec.decode(image)
+            self.assertEqual(decoded,reference.decode(image))
+            self.assertEqual([type(value) for value in decoded],[type(value) for value in values])
+
+    def test_encode_error(self):
+        tabledef=self.runs()
+        values=tabledef.getdefaultvalues()
+        values[20]=-1
+        self.assertIsNone(tabledef.encode(values))
+        with self.assertRaises(struct.error):
+            tabledef.decode(bytes(tabledef.bytesSize()-1))
+
+
+class TestRepeatedItems(DefinitionTestCase):
+    REPEATED=[{"name":"a","datatype":"uint16","count":4,"defaultvalue":7},
+              {"name":"b","datatype":"uint8","defaultvalue":1},
+              {"name":"s","datatype":"string","length":3,"count":2,"defaultvalue":["x","yz"]},
+              {"name":"p","datatype":"uint24","count":2,"defaultvalue":0},
+              {"name":"c","datatype":"uint16","count":3,"defaultvalue":[1,2,3]}]
+
+    def expanded(self):
+        # the same table without count: one item per element
+        items=[]
+        for data in self.REPEATED:
+            count=data.get("count",1)
+            values=data["defaultvalue"] if type(data["defaultvalue"])==type(list()) else [data["defaultvalue"]]*count
+            for i in range(count):
+                item=dict(data,defaultvalue=values[i],name="{0}#{1}".format(data["name"],i) if count>1 else data["name"])
+                item.pop("count",None)
+                items.append(item)
+        return self.definition(items)
+
+    def test_rows(self):
+        tabledef=self.definition(self.REPEATED)
+        expanded=self.expanded()
+        self.assertEqual(len(tabledef),len(expanded))
+        self.assertEqual([item.name for item in tabledef.items],[item.name for item in expanded.items])
+        self.assertEqual([item.offset for item in tabledef.items],[item.offset for item in expanded.items])
+        self.assertEqual(tabledef.getdefaultvalues(),expanded.getdefaultvalues())
+        self.assertEqual(list(tabledef.positions()),list(expanded.positions()))
+        self.assertEqual(tabledef.items[-1].name,"c#2")
+        self.assertEqual(tabledef.items[13:15][1].name,"a#1")
+        # the elements are not stored, all the rows of a repeated item refer to it
+        self.assertIs(tabledef.items.rows[13],tabledef.items.rows[16])
+
+    def test_codec(self):
+        tabledef=self.definition(self.REPEATED)
+        expanded=self.expanded()
+        values=tabledef.getdefaultvalues()
+        for bigendian in (True,False):
+            image=tabledef.encode(values,bigendian)
+            self.assertEqual(image,expanded.encode(values,bigendian))
+            self.assertEqual(tabledef.decode(image,bigendian),values)
+            codec=tabledef.codec(bigendian)
+            self.assertEqual(codec.encodeItem(14,9),struct.pack(">H" if bigendian else "<H",9))
+
+    def test_find(self):
+        tabledef=self.definition(self.REPEATED)
+        self.assertEqual(tabledef.findIndices(["a#0","A#3","b","s#1","c#2"]),[13,16,17,19,24])
+        self.assertEqual(tabledef.findIndices(["a","a#4","a#01","a#-1","b#0","x#0"]),[None]*6)
+
+    def test_invalid(self):
+        for data in ({"name":"a","datatype":"uint8","count":0},
+                     {"name":"a","datatype":"uint8","count":"2"},
+                     {"name":"a","datatype":"uint8","count":3,"defaultvalue":[1,2]}):
+            with self.assertRaises(TypeError):
+                self.definition([data])
+
+
+class TestPositions(DefinitionTestCase):
+    def test_positions(self):
+        tabledef=self.definition(MIXED)
+        sizes=[item.bytesSize() for item in tabledef.items]
+        self.assertEqual(list(tabledef.positions()),[sum(sizes[:row]) for row in range(len(sizes)+1)])
+        self.assertEqual(tabledef.bytesSize(),HEADER_SIZE+41)
+        self.assertEqual(tabledef.headerCount(),13)
+        self.assertEqual(tabledef.span(15,17),(2,5))
+        self.assertEqual(tabledef.span(13,23),(0,41))
+
+    def test_row_at(self):
+        tabledef=self.definition(MIXED)
+        for offset,row in ((-HEADER_SIZE-1,None),(-HEADER_SIZE,0),(-1,12),(0,13),(3,15),(4,16),(40,22),(41,None)):
+            self.assertEqual(tabledef.rowAt(offset),row)
+
+    def test_items_range(self):
+        # same as a scan of the items: the first item at offset or after, then the items fitting in nbytes
+        tabledef=self.definition(MIXED)
+        items=tabledef.items
+        for offset in range(42):
+            for nbytes in range(42):
+                start=next(row for row in range(13,len(items)+1) if row==len(items) or items[row].offset>=offset)
+                stop,size=start,0
+                while stop<len(items) and size+items[stop].bytesSize()<=nbytes:
+                    size+=items[stop].bytesSize()
+                    stop+=1
+                self.assertEqual(tabledef.itemsRange(offset,nbytes),(start,stop))
+
+    def test_range(self):
+        tabledef=self.definition(MIXED)
+        trange,indexes=tabledef.reduceTo(3,9)
+        # pad and u32: u64 does not fit
+        self.assertEqual((trange.start,trange.stop),(16,18))
+        self.assertEqual(list(indexes),list(range(13))+[16,17])
+        self.assertEqual(trange.headerCount(),13)
+        self.assertEqual(trange.dataSize(),7)
+        self.assertEqual(trange.bytesSize(),HEADER_SIZE+7)
+        self.assertEqual([trange.position(row) for row in (12,13,14,15)],[tabledef.position(12),HEADER_SIZE,HEADER_SIZE+3,HEADER_SIZE+7])
+        self.assertEqual(trange.span(13,15),(4,7))
+        for offset,row in ((-HEADER_SIZE,0),(3,None),(4,13),(10,14),(11,None)):
+            self.assertEqual(trange.rowAt(offset),row)
+        self.assertEqual(trange.reduceTo(7,4)[0].start,17)
+        self.assertIs(tabledef.reduceTo(0,41)[0],tabledef)
+
+
+class TestTableDefinitionSearch(DefinitionTestCase):
+    DESCRIPTIONS=["Counter of commands","Temperature offset","Command mask","","Commands accepted",
+                  "Uptime","Gain","OFFSET of the gain","Mode name","Mode"]
+    TEXTS=["com","COMMAND","mand m","and","ter","u8","arr#1","arr#12","#","xyz","","e","off",
+           "counter of","er o","gain","ain","mode n","ffs","accept","commands accepted","0x"]
+
+    def definition(self):
+        items=[dict(data,description=description) for data,description in zip(MIXED,self.DESCRIPTIONS)]
+        items.append({"name":"arr","datatype":"uint8","count":30,"description":"Commands counters"})
+        return super(TestTableDefinitionSearch,self).definition(items)
+
+    def scan(self,tabledef,text):
+        # rows found by comparing text to every item
+        text=text.lower()
+        return [row for row,item in enumerate(tabledef.items)
+                if text in item.name.lower() or text in str(item.description).lower()]
+
+    def test_search(self):
+        tabledef=self.definition()
+        for text in self.TEXTS:
+            self.assertEqual(tabledef.search(text),self.scan(tabledef,text),text)
+        self.assertEqual(tabledef.search("arr#2"),[tabledef.findIndex("arr#2")]+list(range(tabledef.findIndex("arr#20"),tabledef.findIndex("arr#29")+1)))
+        self.assertEqual(tabledef.search("xyz"),[])
+
+    def test_within(self):
+        # a longer text is searched in the rows found for a part of it
+        tabledef=self.definition()
+        for short,text in (("com","command"),("co","commands acc"),("arr","arr#1"),("of","offset")):
+            self.assertEqual(tabledef.search(text,tabledef.search(short)),self.scan(tabledef,text))
+
+    def test_index(self):
+        # the words are indexed once, the trigrams give the words containing them
+        tabledef=self.definition()
+        search=TableDefinitionSearch(tabledef.items)
+        self.assertEqual(len(search.words),len(set(search.words)))
+        for word,trigram in (("commands","com"),("counters","ter")):
+            self.assertIn(search.words.index(word),search.trigrams[trigram])
+        self.assertEqual(sorted(search.wordRows("mand")),self.scan(tabledef,"mand"))
+
+
+class TestTableDefinitionRange(DefinitionTestCase):
+    def check(self,tabledef,start,stop):
+        # the range codec gives the headers and the bytes start to stop of the complete table
+        values=tabledef.getdefaultvalues()
+        header=tabledef.headerCount()
+        for bigendian in (True,False):
+            image=tabledef.encode(values,bigendian)
+            offset,nbytes=tabledef.span(start,stop)
+            trange=TableDefinitionRange(tabledef,start,stop,offset)
+            codec=trange.codec(bigendian)
+            self.assertIsInstance(codec,type(tabledef.codec(bigendian)))
+            partial=image[:tabledef.position(header)]+image[tabledef.position(start):tabledef.position(stop)]
+            rvalues=values[:header]+values[start:stop]
+            self.assertEqual(codec.size,len(partial))
+            self.assertEqual(codec.decode(partial),rvalues)
+            self.assertEqual(codec.encode(rvalues),partial)
+            for row,value in enumerate(rvalues):
+                self.assertEqual(codec.encodeItem(row,value),partial[codec.positions[row]:trange.position(row+1)])
+                self.assertEqual(codec.decodeItem(row,partial),value)
+
+    def test_mixed(self):
+        tabledef=self.definition(MIXED)
+        for start,stop in ((13,23),(13,14),(15,17),(16,22),(21,23),(22,22)):
+            self.check(tabledef,start,stop)
+
+    def test_repeated(self):
+        # ranges starting and ending inside the runs of the repeated items
+        tabledef=self.definition(TestRepeatedItems.REPEATED)
+        for start,stop in ((14,16),(15,21),(18,20),(20,25),(13,25)):
+            self.check(tabledef,start,stop)
+
+    @unittest.skipIf(np is None,"numpy not available")
+    def test_numpy(self):
+        items=[{"name":"a","datatype":"uint16","count":1000,"defaultvalue":3},
+               {"name":"s","datatype":"string","length":5,"defaultvalue":"xyz"},
+               {"name":"b","datatype":"float","count":500,"defaultvalue":0.5}]
+        tabledef=self.definition(items)
+        self.assertIsInstance(tabledef.codec(),TableDefinitionNumpyCodec)
+        for start,stop in ((100,200),(900,1100),(1013,1014)):
+            self.check(tabledef,start,stop)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import pickle
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from TableDefinitionCache import *
+from test_TableDefinition import writeDefinition,MIXED
+
+
+class TestTableDefinitionCache(unittest.TestCase):
+    def setUp(self):
+        self.dirname=tempfile.mkdtemp()
+        self.cachedir=os.path.join(self.dirname,"cache")
+        self.definitions=os.path.join(self.dirname,"definitions")
+        os.mkdir(self.definitions)
+        self.filename=writeDefinition(self.definitions,MIXED)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def cache(self):
+        return TableDefinitionCache(self.definitions,self.cachedir)
+
+    def test_store(self):
+        cache=self.cache()
+        self.assertIsNone(cache.lookup(self.filename))
+        tdef=cache.loadDefinition(self.filename)
+        self.assertTrue(cache.save())
+        # the cache is never written in the definitions directory
+        self.assertEqual(os.listdir(self.definitions),["test.json"])
+        self.assertEqual(os.listdir(self.cachedir),[os.path.basename(cache.filename)])
+        cached=self.cache().lookup(self.filename)
+        self.assertEqual(cached.getTableName(),"T.Test")
+        self.assertEqual(cached.getdefaultvalues(),tdef.getdefaultvalues())
+        self.assertEqual(self.cache().lookupName(self.filename),"T.Test")
+
+    def test_directories(self):
+        # one cache file per definitions directory
+        other=os.path.join(self.dirname,"other")
+        os.mkdir(other)
+        self.assertNotEqual(self.cache().filename,TableDefinitionCache(other,self.cachedir).filename)
+
+    def test_modified(self):
+        cache=self.cache()
+        cache.loadDefinition(self.filename)
+        cache.save()
+        writeDefinition(self.definitions,MIXED,"T.Other")
+        self.assertIsNone(self.cache().lookup(self.filename))
+
+    def test_touched(self):
+        cache=self.cache()
+        cache.loadDefinition(self.filename)
+        cache.save()
+        stat=os.stat(self.filename)
+        os.utime(self.filename,ns=(stat.st_atime_ns,stat.st_mtime_ns+10**9))
+        cache=self.cache()
+        self.assertIsNotNone(cache.lookup(self.filename))
+        # the new modification time is saved
+        self.assertTrue(cache.modified)
+
+    def test_names(self):
+        cache=self.cache()
+        cache.storeName(self.filename,"T.Test","digest")
+        cache.save()
+        cache=self.cache()
+        self.assertEqual(cache.lookupName(self.filename),"T.Test")
+        self.assertIsNone(cache.lookup(self.filename))
+
+    def test_unused(self):
+        # the entries of the removed files are not saved again
+        cache=self.cache()
+        cache.loadDefinition(self.filename)
+        cache.save()
+        cache=self.cache()
+        cache.save()
+        with open(cache.filename,'rb') as fd:
+            version,entries=pickle.load(fd)
+        self.assertEqual(entries,{})
+
+    def test_invalid(self):
+        cache=self.cache()
+        cache.loadDefinition(self.filename)
+        cache.save()
+        with open(cache.filename,'wb') as fd:
+            pickle.dump((CACHE_VERSION-1,cache.entries),fd)
+        self.assertEqual(self.cache().entries,{})
+        with open(cache.filename,'wb') as fd:
+            fd.write(b"not a pickle")
+        self.assertEqual(self.cache().entries,{})
+
+    @unittest.skipIf(os.name=="nt","XDG cache directory")
+    def test_user_directory(self):
+        environ=dict(os.environ)
+        try:
+            os.environ["XDG_CACHE_HOME"]=self.cachedir
+            self.assertEqual(os.path.dirname(TableDefinitionCache(self.definitions).filename),
+                             os.path.join(self.cachedir,"TableManager"))
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+
+if __name__=="__main__":
+    unittest.main()
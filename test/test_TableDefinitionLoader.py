@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import concurrent.futures
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from TableDefinitionLoader import *
+from TableDefinition import TableDefinition
+from test_TableDefinition import writeDefinition,MIXED
+
+
+class LoaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname=tempfile.mkdtemp()
+        self.cachedir=os.path.join(self.dirname,"cache")
+        self.definitions=os.path.join(self.dirname,"definitions")
+        os.mkdir(self.definitions)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self,filename,tablename,items=MIXED):
+        return writeDefinition(self.definitions,items,tablename,filename)
+
+    def loader(self,workers=None):
+        return TableDefinitionLoader(self.definitions,workers,self.cachedir)
+
+
+class TestTableDefinitionLoader(LoaderTestCase):
+    def test_load(self):
+        for i in range(20):
+            self.write("t{0:02}.json".format(i),"T.{0}".format(i))
+        with open(os.path.join(self.definitions,"notes.txt"),'w') as fd:
+            fd.write("not a definition")
+        for workers in (1,4):
+            tablesdefinition,errors=self.loader(workers).load()
+            self.assertEqual(errors,[])
+            self.assertEqual(sorted(tablesdefinition),sorted("T.{0}".format(i) for i in range(20)))
+
+    def test_collision(self):
+        # the first file in name order defines the TableName, whatever the workers
+        self.write("b.json","T.Same")
+        self.write("a.json","T.Same")
+        self.write("c.json","T.Other")
+        for workers in (1,4):
+            loader=self.loader(workers)
+            tablesdefinition,errors=loader.load()
+            self.assertEqual(os.path.basename(tablesdefinition["T.Same"].filename),"a.json")
+            self.assertEqual(loader.origin,{"T.Same":"a.json","T.Other":"c.json"})
+            self.assertEqual(len(errors),1)
+            self.assertEqual(errors[0][0],"b.json")
+            self.assertIn("a.json",errors[0][1])
+
+    def test_errors(self):
+        self.write("a.json","T.A")
+        with open(os.path.join(self.definitions,"b.json"),'w') as fd:
+            fd.write('[{"name":"TableName",')
+        with open(os.path.join(self.definitions,"c.json"),'w') as fd:
+            fd.write('{"name":"TableName"}')
+        tablesdefinition,errors=self.loader().load()
+        self.assertEqual(list(tablesdefinition),["T.A"])
+        self.assertEqual([file for file,error in errors],["b.json","c.json"])
+
+    def test_interrupt(self):
+        for i in range(5):
+            self.write("t{0}.json".format(i),"T.{0}".format(i))
+        loader=self.loader()
+        files=[]
+        for file,tdef,error in loader.definitions():
+            files.append(file)
+            loader.interrupt()
+        self.assertEqual(files,["t0.json"])
+        self.assertFalse(os.path.exists(self.cachedir))
+
+
+class TestLazyDefinitions(LoaderTestCase):
+    def test_read_table_name(self):
+        self.assertEqual(readTableName('[{"Name":"TableName","DataType":"string","length":8,"DefaultValue":"T.A"}]'),"T.A")
+        # only the items up to the TableName item are parsed
+        self.assertEqual(readTableName(' [ {"name":"a","datatype":"uint8"},\n{"NAME":"tablename","datatype":"string","defaultvalue":"T.B"}, oops'),"T.B")
+        for text,error in (('{"name":"TableName"}',ValueError),
+                           ('[{"name":"a","datatype":"uint8"}]',TypeError),
+                           ('[{"name":"TableName","datatype":"bogus","defaultvalue":"T.C"}]',TypeError),
+                           ('[1]',TypeError),
+                           ('[{"name":"TableName",',ValueError)):
+            with self.assertRaises(error):
+                readTableName(text)
+
+    def test_materialize(self):
+        self.write("a.json","T.A")
+        tablesdefinition,errors=self.loader().load()
+        tdef=tablesdefinition["T.A"]
+        self.assertIsInstance(tdef,LazyTableDefinition)
+        self.assertFalse(tdef.isLoaded())
+        self.assertEqual(tdef.getTableName(),"T.A")
+        self.assertFalse(tdef.isLoaded())
+        self.assertEqual(len(tdef),13+len(MIXED))
+        self.assertTrue(tdef.isLoaded())
+        self.assertIs(tdef.materialize(),tdef.materialize())
+        self.assertEqual(tdef.findIndex("u32"),17)
+
+    def test_threads(self):
+        # the definition is built once, whatever the threads materializing it at once
+        filename=self.write("a.json","T.A")
+        calls=[]
+        def loader(filename):
+            calls.append(filename)
+            time.sleep(0.05)
+            return TableDefinition(filename)
+        tdef=LazyTableDefinition(filename,"T.A",loader)
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            tdefs=list(executor.map(lambda i: tdef.materialize(),range(8)))
+        self.assertEqual(calls,[filename])
+        self.assertTrue(all(materialized is tdefs[0] for materialized in tdefs))
+        # the definitions of a loader share its lock
+        loader=self.loader()
+        self.assertIs(loader.load()[0]["T.A"].lock,loader.lock)
+
+    def test_cached(self):
+        filename=self.write("a.json","T.A")
+        self.loader().load()[0]["T.A"].materialize()
+        # the TableName and the definition are read from the cache
+        loader=self.loader()
+        parsed=[]
+        parseNames=loader.parseNames
+        loader.parseNames=lambda filenames: parsed.extend(filenames) or parseNames(filenames)
+        tablesdefinition,errors=loader.load()
+        self.assertEqual(list(tablesdefinition),["T.A"])
+        self.assertEqual(parsed,[])
+        self.assertIsNotNone(loader.cache.lookup(filename))
+        # a modified file is read again
+        self.write("a.json","T.B")
+        tablesdefinition,errors=loader.load()
+        self.assertEqual(list(tablesdefinition),["T.B"])
+        self.assertEqual(parsed,[filename])
+
+    def test_invalid_items(self):
+        # the items after the TableName item are checked on first use
+        self.write("a.json","T.A",MIXED+[{"name":"x","datatype":"bogus"}])
+        tablesdefinition,errors=self.loader().load()
+        self.assertEqual(errors,[])
+        with self.assertRaises(TypeError):
+            tablesdefinition["T.A"].materialize()
+
+
+if __name__=="__main__":
+    unittest.main()
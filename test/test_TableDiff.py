@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import struct
+import random
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from TableDiff import *
+from TableObject import TableObject
+
+TESTDIR=os.path.dirname(os.path.abspath(__file__))
+
+
+class TestMergeSpans(unittest.TestCase):
+    def setUp(self):
+        # 4 bytes items after the headers
+        self.positions=[HEADER_SIZE+4*i for i in range(201)]
+
+    def test_empty(self):
+        self.assertEqual(mergeSpans(self.positions,[]),[])
+
+    def test_adjacent(self):
+        self.assertEqual(mergeSpans(self.positions,[3,4,5]),[(12,12)])
+
+    def test_overhead(self):
+        # merged while the bytes between the spans cost no more than the headers of another table
+        gap=HEADER_SIZE//4
+        self.assertEqual(mergeSpans(self.positions,[0,gap+1]),[(0,4*gap+8)])
+        self.assertEqual(mergeSpans(self.positions,[0,gap+2]),[(0,4),(4*gap+8,4)])
+        self.assertEqual(mergeSpans(self.positions,[0,10,150],overhead=0),[(0,4),(40,4),(600,4)])
+
+
+class TestDiffRows(unittest.TestCase):
+    def setUp(self):
+        self.dirname=tempfile.mkdtemp()
+        with open(os.path.join(TESTDIR,"HK_copy_TBL.json"),'r') as fd:
+            items=json.load(fd)
+        items.append({"name":"Array","datatype":"uint16","count":3000,"defaultvalue":0})
+        filename=os.path.join(self.dirname,"array.json")
+        with open(filename,'w') as fd:
+            json.dump(items,fd)
+        self.tabledef=TableDefinition(filename)
+        self.baseline=TableObject(self.tabledef)
+        self.table=TableObject(self.tabledef)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def edit(self,count,seed):
+        # count random edits of the table: edited rows
+        rand=random.Random(seed)
+        names=[item.name for item in self.tabledef.items if item.name.startswith("Array#")]
+        pairs=[(name,str(rand.randint(1,0xFFFF))) for name in rand.sample(names,count)]
+        changes,errors=self.table.set_many(pairs)
+        return sorted(row for row,previous,value in changes)
+
+    def test_equal(self):
+        rows,rowsA,rowsB=diffRows(self.tabledef,self.baseline.getImage(),self.table.getImage())
+        self.assertEqual(rows,[])
+
+    def test_edits(self):
+        edited=self.edit(20,1)
+        image,other=self.baseline.getImage(),self.table.getImage()
+        rows,rowsA,rowsB=diffRows(self.tabledef,image,other)
+        self.assertEqual(rows,edited)
+        for row,value,othervalue in diffImages(self.tabledef,image,other):
+            self.assertEqual(value,self.baseline.values[row])
+            self.assertEqual(othervalue,self.table.values[row])
+
+    def test_partial(self):
+        # only the items loaded by both images are compared
+        edited=self.edit(30,3)
+        filename=os.path.join(self.dirname,"partial.tbl")
+        offset,nbytes=self.tabledef.span(edited[5],edited[20])
+        self.table.encode(filename,offset,nbytes,settime=False)
+        with readImage(filename) as partial:
+            differences=diffImages(self.tabledef,self.baseline.getImage(),partial)
+        header=self.tabledef.headerCount()
+        self.assertEqual([row for row,value,othervalue in differences if row>=header],edited[5:20])
+        # Offset and NumBytes of the partial table differ
+        self.assertEqual([self.tabledef.items[row].name for row,value,othervalue in differences if row<header],["Offset","NumBytes"])
+        for row,value,othervalue in differences[2:]:
+            self.assertEqual(othervalue,self.table.values[row])
+
+    def test_partial_loads(self):
+        # each edited row is loaded once by the partial tables, the rows between them cost less than headers
+        edited=self.edit(40,2)
+        baseline=os.path.join(self.dirname,"baseline.tbl")
+        self.baseline.encode(baseline,settime=False)
+        loads=self.table.encodePartialLoads(baseline,os.path.join(self.dirname,"load.tbl"),settime=False)
+        self.assertEqual([(offset,nbytes) for name,offset,nbytes in loads],
+                         partialLoads(self.tabledef,self.baseline.getImage(),self.table.getImage()))
+        self.assertEqual([os.path.basename(name) for name,offset,nbytes in loads],
+                         ["load_{0}.tbl".format(i+1) for i in range(len(loads))])
+        loaded=[]
+        for name,offset,nbytes in loads:
+            with readImage(name) as load:
+                position,size=loadSpan(self.tabledef,load)
+                self.assertEqual((position,size),(HEADER_SIZE+offset,nbytes))
+                self.assertEqual(bytes(load[HEADER_SIZE:]),bytes(self.table.getImage()[position:position+size]))
+            loaded+=[row for row in edited if position<=self.tabledef.position(row)<position+size]
+        self.assertEqual(loaded,edited)
+        self.assertLess(len(loads),len(edited))
+
+    def test_partial_baseline(self):
+        # a partial baseline can't be updated to the complete table
+        self.edit(5,5)
+        baseline=os.path.join(self.dirname,"baseline.tbl")
+        self.baseline.encode(baseline,*self.tabledef.span(20,40),settime=False)
+        with self.assertRaises(ValueError):
+            self.table.partialLoads(baseline)
+        # nothing to load from the table itself
+        self.table.encode(baseline,settime=False)
+        self.assertEqual(self.table.partialLoads(baseline),[])
+
+    def test_load_span(self):
+        filename=os.path.join(self.dirname,"load.tbl")
+        self.table.encode(filename,*self.tabledef.span(30,40),settime=False)
+        with readImage(filename) as load:
+            self.assertEqual(loadSpan(self.tabledef,load),(self.tabledef.position(30),self.tabledef.position(40)-self.tabledef.position(30)))
+            image=bytearray(load)
+        for offset,nbytes in ((0,0),(self.tabledef.bytesSize()-HEADER_SIZE-2,4)):
+            struct.pack_into(">II",image,self.tabledef.position(HEADER_OFFSET),offset,nbytes)
+            with self.assertRaises(ValueError):
+                loadSpan(self.tabledef,image)
+        with self.assertRaises(struct.error):
+            loadSpan(self.tabledef,image[:HEADER_SIZE-1])
+
+    def test_files(self):
+        self.edit(10,4)
+        names=[os.path.join(self.dirname,name) for name in ("a.tbl","b.tbl")]
+        self.baseline.encode(names[0],settime=False)
+        self.table.encode(names[1],settime=False)
+        tabledef,differences=diffFiles(names[0],names[1],{self.tabledef.getTableName():self.tabledef})
+        self.assertIs(tabledef,self.tabledef)
+        self.assertEqual(differences,diffImages(self.tabledef,self.baseline.getImage(),self.table.getImage()))
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import sys
+import random
+import unittest
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from TableHistory import TableHistory
+
+
+class Table(object):
+    # values only, as set by the history
+    def __init__(self,count):
+        self.values=[0]*count
+
+    def setValue(self,row,value):
+        self.values[row]=value
+
+    def set(self,history,changes):
+        # set the (row,value) changes and record them as one step
+        history.record([(row,self.values[row],value) for row,value in changes])
+        for row,value in changes:
+            self.values[row]=value
+
+
+class TestTableHistory(unittest.TestCase):
+    def setUp(self):
+        self.table=Table(10)
+        self.history=TableHistory(self.table)
+
+    def test_undo_redo(self):
+        self.table.set(self.history,[(1,5)])
+        self.table.set(self.history,[(2,"text"),(3,1.5)])
+        self.assertEqual(self.history.undo(),[2,3])
+        self.assertEqual(self.table.values[:4],[0,5,0,0])
+        self.assertEqual(self.history.undo(),[1])
+        self.assertIsNone(self.history.undo())
+        self.assertEqual(self.history.redo(),[1])
+        self.assertEqual(self.history.redo(),[2,3])
+        self.assertIsNone(self.history.redo())
+        self.assertEqual(self.table.values[:4],[0,5,"text",1.5])
+
+    def test_merge(self):
+        # consecutive edits of the same cell are one step
+        for value in (1,2,3):
+            self.table.set(self.history,[(4,value)])
+        self.assertEqual(len(self.history),1)
+        self.history.undo()
+        self.assertEqual(self.table.values[4],0)
+        self.history.redo()
+        self.assertEqual(self.table.values[4],3)
+
+    def test_merge_objects(self):
+        # the strings replaced by the merged edits are not kept
+        for i in range(100):
+            self.table.set(self.history,[(4,"v{0}".format(i))])
+            self.table.set(self.history,[(4,i)])
+        self.assertEqual(len(self.history),1)
+        self.assertEqual(self.history.objects,[])
+        self.assertEqual(self.history.objectsize,0)
+        self.table.set(self.history,[(4,"last")])
+        self.assertEqual(self.history.objects,["last"])
+        self.history.undo()
+        self.assertEqual(self.table.values[4],0)
+
+    def test_truncate_objects(self):
+        # the strings of the steps undone are forgotten with them
+        self.table.set(self.history,[(1,"a")])
+        self.table.set(self.history,[(2,"b"),(3,"c")])
+        self.history.undo()
+        self.table.set(self.history,[(2,5)])
+        self.assertEqual(self.history.objects,["a"])
+        self.assertEqual(self.history.objectsize,sys.getsizeof("a"))
+        self.history.undo()
+        self.history.undo()
+        self.assertEqual(self.table.values[:4],[0,0,0,0])
+
+    def test_entry_size(self):
+        # 64 bits rows and steps on every platform, as counted by size()
+        self.table.set(self.history,[(1,1)])
+        self.assertEqual(self.history.rows.itemsize,8)
+        self.assertEqual(self.history.steps.itemsize,8)
+
+    def test_no_merge(self):
+        self.table.set(self.history,[(4,1)])
+        self.table.set(self.history,[(5,1)])
+        self.table.set(self.history,[(5,2),(6,2)])
+        self.table.set(self.history,[(6,3)])
+        self.assertEqual(len(self.history),4)
+        # an undone step is not merged with the next edit
+        self.history.undo()
+        self.table.set(self.history,[(6,4)])
+        self.assertEqual(len(self.history),4)
+        self.history.undo()
+        self.assertEqual(self.table.values[6],2)
+
+    def test_truncate(self):
+        self.table.set(self.history,[(1,1)])
+        self.table.set(self.history,[(2,2)])
+        self.history.undo()
+        self.table.set(self.history,[(3,3)])
+        self.assertFalse(self.history.canRedo())
+        self.assertEqual(len(self.history),2)
+        self.history.undo()
+        self.history.undo()
+        self.assertEqual(self.table.values[:4],[0,0,0,0])
+
+    def test_memory(self):
+        # the oldest steps are forgotten, the remaining ones are undone and redone
+        rand=random.Random(3)
+        history=TableHistory(self.table,memory=2000)
+        states=[list(self.table.values)]
+        for i in range(300):
+            changes=[(rand.randrange(10),rand.choice((i,float(i),"v{0}".format(i)))) for j in range(rand.randint(1,3))]
+            self.table.set(history,changes)
+            self.assertLessEqual(history.size(),history.memory)
+            states.append(list(self.table.values))
+        self.assertLess(len(history),300)
+        for state in reversed(states[-len(history)-1:-1]):
+            history.undo()
+            self.assertEqual(self.table.values,state)
+        self.assertFalse(history.canUndo())
+        for state in states[-len(history):]:
+            history.redo()
+            self.assertEqual(self.table.values,state)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+import os
+import sys
+import struct
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import TableObject as TableObjectModule
+from TableObject import *
+from TableDefinition import _UNDECODED
+from TableHistory import TableHistory
+from TableCRC import crc16arc
+from test_TableDefinition import writeDefinition,MIXED
+
+ARRAY=MIXED+[{"name":"arr","datatype":"uint16","count":3000,"defaultvalue":5}]
+
+
+class TableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dirname=tempfile.mkdtemp()
+        self.tabledef=TableDefinition(writeDefinition(self.dirname,ARRAY))
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def path(self,name):
+        return os.path.join(self.dirname,name)
+
+    def table(self,**values):
+        table=TableObject(self.tabledef)
+        changes,errors=table.set_many((key.replace("_","#"),str(value)) for key,value in values.items())
+        self.assertEqual(errors,[])
+        return table
+
+    def read(self,filename):
+        with open(filename,'rb') as fd:
+            return fd.read()
+
+
+class TestDecode(TableTestCase):
+    def test_decode(self):
+        filename=self.path("a.tbl")
+        original=self.table(u8=3,s="txt",arr_7=77)
+        original.encode(filename,settime=False)
+        table=TableObject(self.tabledef)
+        table.decode(filename)
+        self.assertEqual(list(table.values),list(original.values))
+        self.assertEqual(table.currentfilename,filename)
+        self.assertEqual(table.calculateCRC(),original.calculateCRC())
+        # the file is not kept open or mapped
+        os.remove(filename)
+        table.encode(filename,settime=False)
+        self.assertEqual(self.read(filename),original.getImage())
+
+    def test_partial(self):
+        filename=self.path("p.tbl")
+        offset,nbytes=self.tabledef.span(30,40)
+        self.table(arr_7=10,arr_16=19).encode(filename,offset,nbytes,settime=False)
+        table=TableObject(self.tabledef)
+        table.decode(filename)
+        self.assertIsInstance(table.tabledef,TableDefinitionRange)
+        self.assertEqual(len(table),13+10)
+        self.assertEqual(list(table.values)[13:],[10]+[5]*8+[19])
+        self.assertEqual(table.values[table.tabledef.findIndex("Offset")],offset)
+        self.assertEqual(table.values[table.tabledef.findIndex("NumBytes")],nbytes)
+
+    def test_errors(self):
+        filename=self.path("bad.tbl")
+        image=self.table().getImage()
+        for content in (b"",bytes(image[:HEADER_SIZE-1]),bytes(image[:-1])):
+            with open(filename,'wb') as fd:
+                fd.write(content)
+            table=TableObject(self.tabledef)
+            with self.assertRaises(struct.error):
+                table.decode(filename)
+            self.assertIs(table.tabledef,self.tabledef)
+
+    def test_progress(self):
+        filename=self.path("a.tbl")
+        self.table(u8=9).encode(filename)
+        calls=[]
+        blocksize=TableObjectModule.BLOCK_SIZE
+        TableObjectModule.BLOCK_SIZE=1000
+        try:
+            table=TableObject(self.tabledef)
+            table.decode(filename,progress=lambda done,total: calls.append((done,total)) or True)
+            self.assertEqual(calls[-1],(self.tabledef.bytesSize(),self.tabledef.bytesSize()))
+            self.assertEqual(len(calls),-(-self.tabledef.bytesSize()//1000))
+            # cancelled: the table is unchanged
+            table=TableObject(self.tabledef)
+            with self.assertRaises(OperationCancelled):
+                table.decode(filename,progress=lambda done,total: done<3000)
+            self.assertEqual(table.values[13],200)
+            self.assertIsNone(table.currentfilename)
+        finally:
+            TableObjectModule.BLOCK_SIZE=blocksize
+
+
+class TestLazyValues(TableTestCase):
+    def decoded(self,values):
+        # number of values already decoded
+        return sum(value is not _UNDECODED for value in values.values)
+
+    def test_lazy(self):
+        image=self.table(u16=66,arr_2999=1).getImage()
+        values=self.tabledef.decode(bytearray(image),lazy=True)
+        self.assertIsInstance(values,TableDefinitionValues)
+        self.assertEqual(len(values),len(self.tabledef))
+        # only the strings are decoded at once
+        self.assertEqual(self.decoded(values),3)
+        self.assertEqual(values[15],66)
+        self.assertEqual(values[-1],1)
+        self.assertEqual(values[13:16],[200,-5,66])
+        self.assertEqual(self.decoded(values),7)
+        values[16]=4
+        self.assertEqual(values[16],4)
+        self.assertEqual(list(values),self.tabledef.decode(image)[:16]+[4]+self.tabledef.decode(image)[17:])
+        # every value is decoded, the buffer is released
+        self.assertIsNone(values.buffer)
+
+    def test_invalidate(self):
+        image=bytearray(self.table().getImage())
+        values=self.tabledef.decode(image,lazy=True)
+        self.assertEqual(values[15],0x1234)
+        codec=self.tabledef.codec()
+        image[codec.positions[15]:codec.positions[16]]=codec.encodeItem(15,7)
+        image[codec.positions[21]:codec.positions[22]]=codec.encodeItem(21,"new")
+        self.assertEqual(values[15],0x1234)
+        values.invalidate(15,22)
+        self.assertEqual(values[15],7)
+        self.assertEqual(values.values[21],"new")
+
+    def test_table(self):
+        # edits of a decoded table patch the image without decoding the other values
+        filename=self.path("a.tbl")
+        self.table(arr_5=50).encode(filename,settime=False)
+        table=TableObject(self.tabledef)
+        table.decode(filename)
+        crc=table.calculateCRC()
+        changes,errors=table.set_many([("arr#6","60")])
+        self.assertEqual(self.decoded(table.values),4)
+        self.assertNotEqual(table.calculateCRC(),crc)
+        self.assertEqual(table.getImage(),self.table(arr_5=50,arr_6=60).getImage())
+        self.assertEqual(table.values[table.tabledef.findIndex("arr#5")],50)
+
+
+class TestSetMany(TableTestCase):
+    def test_set_many(self):
+        table=self.table()
+        table.getImage()
+        crc=table.calculateCRC()
+        changes,errors=table.set_many([("u8","7"),("nope","1"),("u16","x"),("arr#3","9"),("U8","8"),("s","hello")])
+        # the errors are listed, the valid values are set in order
+        self.assertEqual(errors,["nope not found","u16 value error x"])
+        self.assertEqual(changes,[(13,200,7),(26,5,9),(13,7,8),(21,"abc","hello")])
+        self.assertTrue(table.isEdited)
+        self.assertEqual(table.get_many([13,15,21,26]),[8,0x1234,"hello",9])
+        expected=self.table(u8=8,arr_3=9,s="hello")
+        self.assertEqual(table.getImage(),expected.getImage())
+        self.assertNotEqual(table.calculateCRC(),crc)
+        self.assertEqual(table.calculateCRC(),expected.calculateCRC())
+
+    def test_invalid(self):
+        # values not cast are never set
+        table=TableObject(self.tabledef)
+        image=bytes(table.getImage())
+        changes,errors=table.set_many([("u8","256"),("i8","-129"),("e","MAYBE"),("arr#3000","1")])
+        self.assertEqual(changes,[])
+        self.assertEqual(len(errors),4)
+        self.assertFalse(table.isEdited)
+        self.assertEqual(table.getImage(),image)
+
+    def test_undo(self):
+        # the changes of set_many are undone as one step, restoring the image and CRC
+        table=self.table()
+        image=bytes(table.getImage())
+        crc=table.calculateCRC()
+        history=TableHistory(table)
+        changes,errors=table.set_many([("u8","1"),("s","xy"),("u8","2"),("d","0.5")])
+        history.record(changes)
+        self.assertEqual(len(history),1)
+        self.assertEqual(history.undo(),[13,21,13,20])
+        self.assertEqual(table.getImage(),image)
+        self.assertEqual(table.calculateCRC(),crc)
+        history.redo()
+        self.assertEqual(table.get_many([13,20,21]),[2,0.5,"xy"])
+
+
+class TestApplyLoads(TableTestCase):
+    def loads(self,baseline,table,name="load.tbl"):
+        # partial tables updating the baseline file to table
+        return [filename for filename,offset,nbytes in table.encodePartialLoads(baseline,self.path(name),settime=False)]
+
+    def test_round_trip(self):
+        baseline=self.path("baseline.tbl")
+        self.table().encode(baseline,settime=False)
+        edited=self.table(u8=3,s="new",arr_7=70,arr_8=80,arr_2000=1)
+        table=TableObject(self.tabledef)
+        table.decode(baseline)
+        crc=table.applyLoads(self.loads(baseline,edited))
+        self.assertEqual(crc,edited.calculateCRC())
+        self.assertEqual(crc,crc16arc(table.getImage()[HEADER_SIZE:]))
+        self.assertEqual(table.getImage()[HEADER_SIZE:],edited.getImage()[HEADER_SIZE:])
+        self.assertEqual(list(table.values)[13:],list(edited.values)[13:])
+        self.assertTrue(table.isEdited)
+
+    def test_order(self):
+        # the loads are applied in their order, the last one wins
+        baseline=self.path("baseline.tbl")
+        self.table().encode(baseline,settime=False)
+        first=self.loads(baseline,self.table(arr_7=1,arr_9=1),"first.tbl")
+        second=self.loads(baseline,self.table(arr_7=2),"second.tbl")
+        table=TableObject(self.tabledef)
+        table.decode(baseline)
+        table.applyLoads(first+second)
+        self.assertEqual(table.get_many([self.tabledef.findIndex(name) for name in ("arr#7","arr#9")]),[2,1])
+
+    def test_invalid(self):
+        # the loads before an invalid load stay applied
+        baseline=self.path("baseline.tbl")
+        self.table().encode(baseline,settime=False)
+        loads=self.loads(baseline,self.table(arr_7=7))
+        invalid=self.path("invalid.tbl")
+        with open(invalid,'wb') as fd:
+            fd.write(self.read(loads[0])[:HEADER_SIZE+1])
+        table=TableObject(self.tabledef)
+        table.decode(baseline)
+        with self.assertRaises(ValueError):
+            table.applyLoads(loads+[invalid])
+        self.assertEqual(table.values[self.tabledef.findIndex("arr#7")],7)
+        self.assertEqual(table.calculateCRC(),crc16arc(table.getImage()[HEADER_SIZE:]))
+        # onto a partial table
+        partial=self.path("partial.tbl")
+        self.table().encode(partial,*self.tabledef.span(30,40),settime=False)
+        table=TableObject(self.tabledef)
+        table.decode(partial)
+        with self.assertRaises(ValueError):
+            table.applyLoads(loads)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import sys
+import shutil
+import tempfile
+import logging
+import unittest
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM","offscreen")
+try:
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtTest import QTest
+    from PyQt5.QtWidgets import QApplication,QAbstractItemView,QStyleOptionViewItem,QComboBox,QLineEdit
+    from TableViewer import *
+    # TableManager logs in the current directory
+    LOGDIR=tempfile.mkdtemp()
+    cwd=os.getcwd()
+    os.chdir(LOGDIR)
+    try:
+        import TableManager
+    finally:
+        os.chdir(cwd)
+except ImportError:
+    QApplication=None
+from TableObject import TableObject
+from TableDefinition import TableDefinition,LazyTableDefinition
+from test_TableDefinition import writeDefinition,MIXED
+
+ARRAY=MIXED+[{"name":"arr","datatype":"uint16","count":2500,"defaultvalue":5}]
+
+
+def tearDownModule():
+    if QApplication is not None:
+        logging.shutdown()
+        shutil.rmtree(LOGDIR)
+
+
+@unittest.skipIf(QApplication is None,"PyQt5 not available")
+class ViewerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app=QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.dirname=tempfile.mkdtemp()
+        self.table=TableObject(TableDefinition(writeDefinition(self.dirname,ARRAY)))
+        self.model=CustomTableModel(self.table)
+        self.view=TableView()
+        self.view.setModel(TableFilterModel(self.model,self.view))
+        self.view.setItemDelegate(CustomDelegate())
+        self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+
+    def tearDown(self):
+        self.view.deleteLater()
+        shutil.rmtree(self.dirname)
+
+    def selectedRows(self):
+        return self.view.model().sourceRows(self.view.selectionModel().selectedRows())
+
+
+class TestTableView(ViewerTestCase):
+    def test_fetch(self):
+        self.assertEqual(self.view.model().rowCount(),FETCH_ROWS)
+        self.view.model().fetchMore()
+        self.assertEqual(self.view.model().rowCount(),2*FETCH_ROWS)
+
+    def test_select_all(self):
+        # the rows not fetched yet are selected too
+        QTest.keyClick(self.view,Qt.Key_A,Qt.ControlModifier)
+        self.assertEqual(self.model.rowCount(),len(self.table))
+        rows=self.selectedRows()
+        self.assertEqual(rows,list(range(len(self.table))))
+        self.assertEqual(len(self.model.copyText(rows).splitlines()),len(self.table))
+
+
+class TestDelegate(ViewerTestCase):
+    def editor(self,row):
+        # editor of the value of the view row, then set to the table
+        index=self.view.model().index(row,3)
+        delegate=self.view.itemDelegate()
+        editor=delegate.createEditor(self.view.viewport(),QStyleOptionViewItem(),index)
+        delegate.setEditorData(editor,index)
+        return index,editor
+
+    def test_filtered(self):
+        # the view rows are mapped to the table rows
+        self.view.model().setFilter("arr#249")
+        index,editor=self.editor(1)
+        row=self.table.tabledef.findIndex("arr#2490")
+        self.assertEqual(self.view.model().mapToSource(index).row(),row)
+        self.assertIsInstance(editor,QLineEdit)
+        self.assertEqual(editor.validator().maxi,0xFFFF)
+        editor.setText("77")
+        self.view.itemDelegate().setModelData(editor,self.view.model(),index)
+        self.assertEqual(self.table.values[row],77)
+        self.assertEqual(self.view.model().data(index,Qt.DisplayRole),77)
+
+    def test_enum(self):
+        self.view.model().setFilter("e")
+        row=self.view.model().rows.index(self.table.tabledef.findIndex("e"))
+        index,editor=self.editor(row)
+        self.assertIsInstance(editor,QComboBox)
+        self.assertEqual([editor.itemText(i) for i in range(editor.count())],["OFF [0]","ON [1]"])
+        self.assertEqual(editor.currentText(),"ON [1]")
+
+
+class TestTableOpenThread(ViewerTestCase):
+    def open(self,tablesdefinition):
+        filename=os.path.join(self.dirname,"a.tbl")
+        self.table.encode(filename)
+        thread=TableManager.TableOpenThread(filename,tablesdefinition)
+        thread.run()
+        return thread
+
+    def test_open(self):
+        thread=self.open({"T.Test":self.table.tabledef})
+        self.assertIsNone(thread.error)
+        self.assertEqual(list(thread.table.values),list(self.table.values))
+
+    def test_unexpected_error(self):
+        # any error of the thread is reported, the thread always finishes
+        def loader(filename):
+            raise RuntimeError("unexpected")
+        tdef=LazyTableDefinition(self.table.tabledef.filename,"T.Test",loader)
+        thread=self.open({"T.Test":tdef})
+        self.assertIn("unexpected",thread.error)
+        self.assertIsNone(thread.table)
+
+
+if __name__=="__main__":
+    unittest.main()